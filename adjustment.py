@@ -0,0 +1,162 @@
+"""
+本地复权：由一次不复权日 K 与一次前复权日 K 推导出除权事件，之后任意周期的不复权 K 线都在本地换算为
+前复权 / 后复权价格，不再为每种复权方式分别向上游请求。
+
+  前复权因子 F(d) = Π 除权日晚于 d 的事件比例（最新一天为 1），前复权价 = 不复权价 × F(d)
+  后复权因子 B(d) = Π 除权日不晚于 d 的事件比例的倒数（最早一次事件之前为 1），后复权价 = 不复权价 × B(d)
+
+事件比例 r = 除权日前一段的 F / 除权日起一段的 F，只取决于该次除权本身，新的除权事件不会改变已有事件；
+前复权价格则会随新事件整体变化，因此因子表每天从上游重新推导一次。
+事件表从上游最早可取到的日期（约为上市日期）起推导，后复权以该日期为基准，结果与请求过哪些区间无关。
+复权价格保留的小数位取上游价格（不复权 K 线与上游前复权 K 线）的小数位；成交量 / 成交额保持不复权的值。
+"""
+import datetime as dt
+from bisect import bisect_right
+from decimal import Decimal
+from typing import Callable
+
+_PRICE_FIELDS = ("open", "high", "low", "close")
+
+
+def _decimals(value: Decimal) -> int:
+    exponent = value.as_tuple().exponent
+    return -exponent if isinstance(exponent, int) and exponent < 0 else 0
+
+
+def price_decimals(rows: list[dict]) -> int:
+    """rows 中价格字段的最大小数位数。"""
+    return max((_decimals(Decimal(r[name])) for r in rows for name in _PRICE_FIELDS), default=0)
+
+
+class AdjustmentFactors:
+    """
+    单个标的的除权事件表 [(除权日, 比例)]，已推导过的日期区间 [begin, end]、推导日期，
+    以及上游前复权价格的小数位数 decimals。begin 为上游最早可取到的日期，后复权以它为基准。
+    """
+
+    __slots__ = ("begin", "end", "derived_on", "decimals", "dates", "ratios", "_forward", "_backward")
+
+    def __init__(
+        self, begin: dt.date, end: dt.date, derived_on: dt.date, events: list[tuple[dt.date, Decimal]],
+        decimals: int = 0,
+    ):
+        self.begin = begin
+        self.end = end
+        self.derived_on = derived_on
+        self.decimals = decimals
+        events = sorted(events)
+        self.dates = [d for d, _ in events]
+        self.ratios = [r for _, r in events]
+        # i = bisect_right(dates, d)：_forward[i] 为第 i 个及之后的事件比例之积
+        self._forward = [Decimal(1)] * (len(events) + 1)
+        for i in range(len(events) - 1, -1, -1):
+            self._forward[i] = self._forward[i + 1] * self.ratios[i]
+        # _backward[i] 为前 i 个事件比例之积的倒数
+        self._backward = [Decimal(1)] * (len(events) + 1)
+        for i, ratio in enumerate(self.ratios):
+            self._backward[i + 1] = self._backward[i] / ratio
+
+    def adjust(self, rows: list[dict], mode: str, day_start: Callable[[dt.date], int]) -> list[dict]:
+        """
+        把按时间升序的不复权 K 线换算为 mode（forward / backward）复权价格。
+        day_start(除权日) 为该日第一根 K 线时间戳的下界，K 线按时间戳二分归入各除权区间。
+        """
+        cuts = [day_start(d) for d in self.dates]
+        table = self._forward if mode == "forward" else self._backward
+        return _apply(rows, [table[bisect_right(cuts, r["timestamp"])] for r in rows], self.decimals)
+
+    def backward_from_forward(self, rows: list[dict]) -> list[dict]:
+        """
+        由上游的前复权 K 线得到后复权 K 线：B(d) = F(d) / F(begin)，F(begin) 为全部事件比例之积，
+        对周 / 月 / 年 K 等跨越除权日的 K 线同样成立。要求事件表覆盖到当天。
+        """
+        return _apply(rows, [1 / self._forward[0]] * len(rows), self.decimals)
+
+    def merged(
+        self, events: list[tuple[dt.date, Decimal]], begin: dt.date, end: dt.date, first: dt.date, derived_on: dt.date,
+        decimals: int = 0,
+    ) -> "AdjustmentFactors":
+        """
+        用在 [begin, end] 重新推导出的事件替换 (first, end] 内的已有事件，覆盖区间扩展到包含 [begin, end]。
+        first 为该区间内第一根 K 线的日期：恰好在 first 的除权没有前一天可比较，保留已有值。
+        """
+        kept = [(d, r) for d, r in zip(self.dates, self.ratios) if not first < d <= end]
+        return AdjustmentFactors(
+            min(self.begin, begin), max(self.end, end), derived_on, kept + events, max(self.decimals, decimals),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "begin":      self.begin.isoformat(),
+            "end":        self.end.isoformat(),
+            "derived_on": self.derived_on.isoformat(),
+            "decimals":   self.decimals,
+            "events":     [[d.isoformat(), str(r)] for d, r in zip(self.dates, self.ratios)],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AdjustmentFactors":
+        return cls(
+            dt.date.fromisoformat(data["begin"]),
+            dt.date.fromisoformat(data["end"]),
+            dt.date.fromisoformat(data["derived_on"]),
+            [(dt.date.fromisoformat(d), Decimal(r)) for d, r in data["events"]],
+            int(data.get("decimals", 0)),
+        )
+
+
+def derive_events(
+    raw: list[dict], adjusted: list[dict], bar_date: Callable[[int], dt.date],
+) -> list[tuple[dt.date, Decimal]]:
+    """
+    由同一区间的不复权日 K（raw）与前复权日 K（adjusted）推导除权事件 [(除权日, 比例)]。
+    逐日 F = 前复权收盘 / 不复权收盘；F 的变化超出两边价格的舍入误差即视为一次除权，
+    每段取不复权收盘价最高的一天（舍入误差最小）的 F 作为该段的值。
+    """
+    closes = {r["timestamp"]: Decimal(r["close"]) for r in raw}
+    runs: list[list[tuple[dt.date, Decimal, Decimal, Decimal]]] = []
+    for row in sorted(adjusted, key=lambda r: r["timestamp"]):
+        raw_close = closes.get(row["timestamp"])
+        if not raw_close:
+            continue
+        adj_close = Decimal(row["close"])
+        factor = adj_close / raw_close
+        # 前复权价舍入最小单位带来的 F 误差上限
+        tolerance = Decimal(1).scaleb(-_decimals(adj_close)) / raw_close
+        point = (bar_date(row["timestamp"]), factor, tolerance, raw_close)
+        if runs:
+            _, ref, ref_tol, _ = runs[-1][0]
+            if abs(factor - ref) <= tolerance + ref_tol:
+                runs[-1].append(point)
+                continue
+        runs.append([point])
+
+    def _value(run) -> Decimal:
+        return max(run, key=lambda p: p[3])[1]
+
+    return [(cur[0][0], _value(prev) / _value(cur)) for prev, cur in zip(runs, runs[1:])]
+
+
+def _apply(rows: list[dict], factors: list[Decimal], decimals: int) -> list[dict]:
+    """
+    按每根 K 线的因子换算价格；相邻因子相同的 K 线成段处理，因子为 1 的段原样返回。
+    换算后的价格保留 rows 与上游前复权价格（decimals）中较多的小数位。
+    """
+    quant = Decimal(1).scaleb(-max(price_decimals(rows), decimals))
+    result: list[dict] = []
+    lo = 0
+    while lo < len(rows):
+        factor = factors[lo]
+        hi = lo + 1
+        while hi < len(rows) and factors[hi] == factor:
+            hi += 1
+        if factor == 1:
+            result.extend(rows[lo:hi])
+        else:
+            for row in rows[lo:hi]:
+                adjusted = dict(row)
+                for name in _PRICE_FIELDS:
+                    adjusted[name] = str((Decimal(row[name]) * factor).quantize(quant))
+                result.append(adjusted)
+        lo = hi
+    return result
@@ -0,0 +1,145 @@
+"""
+由逐笔成交实时聚合多周期 K 线（OHLCV + 成交额）。
+
+每个 (标的, 周期) 维护一根进行中的 K 线与最近若干根已收盘 K 线；
+K 线按 Unix 时间对齐到周期整数倍，成交进入下一周期或定时检查发现周期已过时收盘。
+"""
+from collections import deque
+from decimal import Decimal
+
+# 支持的聚合周期 → 秒数
+BAR_PERIOD_SECONDS: dict[str, int] = {
+    "1s":    1,
+    "1min":  60,
+    "5min":  300,
+    "15min": 900,
+}
+
+
+class _Bar:
+    __slots__ = ("start", "open", "high", "low", "close", "volume", "turnover")
+
+    def __init__(self, start: int, price: Decimal):
+        self.start = start
+        self.open = self.high = self.low = self.close = price
+        self.volume = 0
+        self.turnover = Decimal(0)
+
+    def add(self, price: Decimal, volume: int):
+        if price > self.high:
+            self.high = price
+        if price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += volume
+        self.turnover += price * volume
+
+    def to_dict(self, period: str, closed: bool) -> dict:
+        return {
+            "period":    period,
+            "timestamp": self.start,
+            "open":      str(self.open),
+            "close":     str(self.close),
+            "high":      str(self.high),
+            "low":       str(self.low),
+            "volume":    self.volume,
+            "turnover":  str(self.turnover),
+            "closed":    closed,
+        }
+
+
+class BarAggregator:
+    """按标的、周期增量聚合 K 线。"""
+
+    def __init__(self, periods: list[str], history: int = 500):
+        unknown = [p for p in periods if p not in BAR_PERIOD_SECONDS]
+        if unknown:
+            raise ValueError(f"unsupported bar periods: {unknown}")
+        self._periods = [(p, BAR_PERIOD_SECONDS[p]) for p in periods]
+        self._history = history
+        self._current: dict[tuple[str, str], _Bar] = {}
+        self._closed: dict[tuple[str, str], deque] = {}
+        # 每个 (标的, 周期) 最后一根已收盘 K 线的起始时间：不早于它的成交不再开新 K 线
+        self._last_closed: dict[tuple[str, str], int] = {}
+        self.late_trades = 0
+
+    @property
+    def periods(self) -> list[str]:
+        return [p for p, _ in self._periods]
+
+    def on_trades(self, symbol: str, trades: list[tuple[int, Decimal, int]]) -> list[dict]:
+        """
+        处理一批成交 (timestamp 秒, price, volume)，返回需要推送的 K 线：
+        期间收盘的 K 线（closed=true）以及各周期进行中 K 线的最新状态（closed=false）。
+        """
+        out: list[dict] = []
+        for period, seconds in self._periods:
+            key = (symbol, period)
+            bar = self._current.get(key)
+            last_closed = self._last_closed.get(key)
+            touched = False
+            for ts, price, volume in trades:
+                start = ts - ts % seconds
+                if bar is None and last_closed is not None and start <= last_closed:
+                    # 该周期已被 sweep 收盘，迟到成交不再产生重复 / 乱序的 K 线
+                    self.late_trades += 1
+                    continue
+                if bar is None or start > bar.start:
+                    if bar is not None:
+                        out.append(self._close(key, bar, period))
+                    bar = self._current[key] = _Bar(start, price)
+                elif start < bar.start:
+                    # 早于进行中 K 线的迟到成交不再回写已收盘的 K 线
+                    self.late_trades += 1
+                    continue
+                bar.add(price, volume)
+                touched = True
+            if touched:
+                out.append(bar.to_dict(period, False))
+        return out
+
+    def sweep(self, now: float, grace: float = 2.0) -> list[tuple[str, dict]]:
+        """把周期已结束（超过 grace 秒）仍未收盘的 K 线收盘，返回 [(symbol, bar)]。"""
+        seconds_of = dict(self._periods)
+        out = []
+        for key, bar in list(self._current.items()):
+            symbol, period = key
+            if now >= bar.start + seconds_of[period] + grace:
+                del self._current[key]
+                out.append((symbol, self._close(key, bar, period)))
+        return out
+
+    def _close(self, key: tuple[str, str], bar: _Bar, period: str) -> dict:
+        closed = self._closed.get(key)
+        if closed is None:
+            closed = self._closed[key] = deque(maxlen=self._history)
+        data = bar.to_dict(period, True)
+        closed.append(data)
+        self._last_closed[key] = bar.start
+        return data
+
+    def bars(self, symbol: str, period: str, count: int) -> dict:
+        """最近 count 根已收盘 K 线与进行中的 K 线。"""
+        key = (symbol, period)
+        closed = list(self._closed.get(key, ()))
+        current = self._current.get(key)
+        return {
+            "symbol":  symbol,
+            "period":  period,
+            "bars":    closed[-count:] if count > 0 else [],
+            "current": current.to_dict(period, False) if current is not None else None,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "periods":     self.periods,
+            "open_bars":   len(self._current),
+            "late_trades": self.late_trades,
+        }
+
+    def drop(self, symbol: str):
+        """标的退订后清除其全部 K 线。"""
+        for period, _ in self._periods:
+            self._current.pop((symbol, period), None)
+            self._closed.pop((symbol, period), None)
+            self._last_closed.pop((symbol, period), None)
@@ -0,0 +1,134 @@
+"""
+WebSocket 推送扇出微基准：1000 个连接订阅同一标的，对比
+  legacy      —— 原 broadcast：每条消息 json.dumps 一次，逐连接串行 await send_text
+  per_client  —— 按连接编码（路由 / 批量 / 格式协商后若不共享编码结果的做法）
+  envelope    —— WebSocketManager：每种线上格式只编码一次，所有连接共享
+
+假连接的 send_text 不做任何 IO，因此 legacy 只反映纯编码开销；真实网络下它按连接串行等待，
+一个慢连接会拖住所有连接。envelope 额外包含每连接队列与写任务的调度开销（每次投递约 1–2 µs），
+这是换取慢连接隔离与慢消费者策略的固定成本。--slow-ms 让其中一个连接每次发送耗时若干毫秒，
+此时计时为其余连接收完全部消息的时间：legacy 被慢连接拖住，envelope 不受影响。
+
+运行: python benchmarks/ws_fanout.py [--clients 1000] [--messages 200] [--slow-ms 0]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from websocket_manager import WebSocketManager  # noqa: E402
+from wire_format import orjson  # noqa: E402
+
+SYMBOL = "700.HK"
+
+
+def _sample_message(i: int) -> dict:
+    return {
+        "type": "quote",
+        "symbol": SYMBOL,
+        "data": {
+            "last_done":  f"385.{i % 100:02d}",
+            "open":       "380.00",
+            "high":       "387.00",
+            "low":        "379.50",
+            "volume":     12345678 + i,
+            "turnover":   "4738291234.00",
+            "change":     "5.40",
+            "change_pct": "1.42",
+            "timestamp":  1771621140 + i,
+            "is_up":      True,
+        },
+    }
+
+
+class _NullWebSocket:
+    """丢弃所有数据的假连接，只统计字节数。"""
+
+    client = None
+
+    def __init__(self, delay: float = 0.0):
+        self.bytes = 0
+        self.delay = delay
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.bytes += len(text)
+
+    async def send_bytes(self, data: bytes):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.bytes += len(data)
+
+
+async def bench_legacy(clients: list[_NullWebSocket], messages: list[dict]) -> float:
+    start = time.perf_counter()
+    for msg in messages:
+        payload = json.dumps(msg, ensure_ascii=False)
+        for ws in clients:
+            await ws.send_text(payload)
+    return time.perf_counter() - start
+
+
+async def bench_per_client(clients: list[_NullWebSocket], messages: list[dict]) -> float:
+    start = time.perf_counter()
+    for msg in messages:
+        for ws in clients:
+            await ws.send_text(json.dumps(msg, ensure_ascii=False))
+    return time.perf_counter() - start
+
+
+async def bench_envelope(clients: list[_NullWebSocket], messages: list[dict]) -> float:
+    manager = WebSocketManager(max_queue=len(messages) + 1)
+    for ws in clients:
+        await manager.connect(ws)
+        await manager.subscribe(ws, [SYMBOL])
+    start = time.perf_counter()
+    for msg in messages:
+        await manager.publish(SYMBOL, msg)
+    # 等待（慢连接以外的）所有写任务清空队列
+    pending = [c for c in manager._clients.values() if not c.ws.delay]
+    while pending:
+        await asyncio.sleep(0)
+        pending = [c for c in pending if c.queue]
+    elapsed = time.perf_counter() - start
+    for ws in clients:
+        await manager.disconnect(ws)
+    return elapsed
+
+
+async def main(n_clients: int, n_messages: int, slow_ms: float):
+    messages = [_sample_message(i) for i in range(n_messages)]
+    total = n_clients * n_messages
+    print(
+        f"clients={n_clients} messages={n_messages} deliveries={total} "
+        f"slow_ms={slow_ms} orjson={'yes' if orjson else 'no'}"
+    )
+    for name, bench in (
+        ("legacy", bench_legacy),
+        ("per_client", bench_per_client),
+        ("envelope", bench_envelope),
+    ):
+        clients = [_NullWebSocket() for _ in range(n_clients - 1)] + [_NullWebSocket(slow_ms / 1000)]
+        elapsed = await bench(clients, messages)
+        sent = sum(ws.bytes for ws in clients)
+        print(
+            f"{name:<11} {elapsed * 1000:9.1f} ms  "
+            f"{total / elapsed / 1e6:6.2f} M deliveries/s  {sent / 1e6:8.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--slow-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.clients, args.messages, args.slow_ms))
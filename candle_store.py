@@ -0,0 +1,313 @@
+"""
+本地历史 K 线库：按 (标的, 周期) 列式存储已收盘的 K 线，并记录已从上游拉取过的日期区间。
+
+  - 每个序列的各字段为一列 array（时间戳 / 缩放后的 OHLC / 成交量 / 缩放后的成交额），时间戳升序
+  - 覆盖区间 [begin, end] 是连续的日期区间：区间内的 K 线已全部在库中（非交易日自然没有 K 线），
+    查询只需向上游补齐区间之外的头部 / 尾部，再合并入库
+  - 当天的 K 线尚未收盘，不入库，由调用方每次从上游取
+  - 每个序列一个文件：一行 JSON 头 + 各列的原始字节（本机字节序），写入时先写临时文件再替换；
+    directory 为空时只保存在内存中。内存中最多保留 max_series 个序列，超出按 LRU 释放（磁盘上仍在）
+
+只存不复权的日 K 与分钟 K：周 / 月 / 年 K 的当前一根跨越多日持续变化，且根数很少，直接走上游。
+复权由 adjustment.py 在读取时换算，每个标的的除权事件表另存为 factors.json。
+"""
+import asyncio
+import datetime as dt
+import json
+import logging
+import os
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from decimal import Decimal
+from pathlib import Path
+
+from market_calendar import MARKET_TIMEZONES, symbol_market
+
+logger = logging.getLogger(__name__)
+
+STORED_PERIODS = frozenset({"1min", "5min", "15min", "30min", "60min", "day"})
+
+_MAX_SCALE = 9
+_PRICE_FIELDS = ("open", "high", "low", "close")
+_UTC = dt.timezone.utc
+# 日 K 的时间戳是当日零点，但时区因市场 / 接口而异；加 12 小时后取 UTC 日期，对 ±12 小时内的任意时区都得到同一天
+_DAY_SHIFT = 12 * 3600
+
+
+def market_timezone(symbol: str) -> dt.tzinfo:
+    market = symbol_market(symbol)
+    return MARKET_TIMEZONES[market] if market else _UTC
+
+
+def market_today(symbol: str) -> dt.date:
+    return dt.datetime.now(market_timezone(symbol)).date()
+
+
+def day_start(day: dt.date, period: str, tz: dt.tzinfo) -> int:
+    """交易日 day 的 K 线时间戳下界。"""
+    if period == "day":
+        return int(dt.datetime.combine(day, dt.time(), _UTC).timestamp()) - _DAY_SHIFT
+    return int(dt.datetime.combine(day, dt.time(), tz).timestamp())
+
+
+def bar_date(ts: int, period: str, tz: dt.tzinfo) -> dt.date:
+    """K 线所属的交易日：日 K 按 _DAY_SHIFT 取日期，分钟 K 取市场时区的日期。"""
+    if period == "day":
+        return dt.datetime.fromtimestamp(ts + _DAY_SHIFT, _UTC).date()
+    return dt.datetime.fromtimestamp(ts, tz).date()
+
+
+def _decimals(value: str) -> int:
+    exponent = Decimal(value).as_tuple().exponent
+    return -exponent if isinstance(exponent, int) and exponent < 0 else 0
+
+
+def _unscale(value: int, scale: int) -> str:
+    return str(Decimal(value).scaleb(-scale))
+
+
+class CandleSeries:
+    """单个 (标的, 周期) 的列式 K 线与覆盖区间。"""
+
+    __slots__ = ("period", "tz", "begin", "end", "scale", "turnover_scale",
+                 "ts", "open", "high", "low", "close", "volume", "turnover")
+
+    def __init__(self, period: str, tz: dt.tzinfo):
+        self.period = period
+        self.tz = tz
+        self.begin: dt.date | None = None
+        self.end: dt.date | None = None
+        self.scale = 0
+        self.turnover_scale = 0
+        self.ts = array("q")
+        self.open = array("q")
+        self.high = array("q")
+        self.low = array("q")
+        self.close = array("q")
+        self.volume = array("q")
+        self.turnover = array("q")
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def _columns(self) -> tuple[array, ...]:
+        return self.ts, self.open, self.high, self.low, self.close, self.volume, self.turnover
+
+    # ------------------------------------------------------------------ #
+    # 日期 ↔ 时间戳
+    # ------------------------------------------------------------------ #
+    def bounds(self, begin: dt.date, end: dt.date) -> tuple[int, int]:
+        """交易日 [begin, end] 对应的时间戳区间 [lo, hi)。"""
+        return day_start(begin, self.period, self.tz), day_start(end + dt.timedelta(days=1), self.period, self.tz)
+
+    def bar_date(self, ts: int) -> dt.date:
+        return bar_date(ts, self.period, self.tz)
+
+    # ------------------------------------------------------------------ #
+    # 覆盖区间
+    # ------------------------------------------------------------------ #
+    def gaps(self, begin: dt.date, end: dt.date) -> list[tuple[dt.date, dt.date]]:
+        """
+        为覆盖 [begin, end] 需要从上游补齐的日期区间（至多头、尾两段）。
+        请求与已有区间不相连时，补齐的区间延伸到已有区间，保证合并后仍然连续。
+        """
+        if begin > end:
+            return []
+        if self.begin is None:
+            return [(begin, end)]
+        one = dt.timedelta(days=1)
+        result = []
+        if begin < self.begin:
+            result.append((begin, self.begin - one))
+        if end > self.end:
+            result.append((self.end + one, end))
+        return result
+
+    # ------------------------------------------------------------------ #
+    # 写入
+    # ------------------------------------------------------------------ #
+    def _rescale(self, scale: int, turnover_scale: int):
+        if scale > self.scale:
+            factor = 10 ** (scale - self.scale)
+            for name in _PRICE_FIELDS:
+                setattr(self, name, array("q", (v * factor for v in getattr(self, name))))
+            self.scale = scale
+        if turnover_scale > self.turnover_scale:
+            factor = 10 ** (turnover_scale - self.turnover_scale)
+            self.turnover = array("q", (v * factor for v in self.turnover))
+            self.turnover_scale = turnover_scale
+
+    def merge(self, rows: list[dict], begin: dt.date, end: dt.date):
+        """
+        写入从上游拉取的 [begin, end] 区间内的 K 线（与 get_candlesticks 的字典格式相同），
+        并把覆盖区间扩展到包含 [begin, end]；时间戳相同的 K 线以新数据为准。
+        """
+        if rows:
+            scale = min(max(_decimals(r[f]) for r in rows for f in _PRICE_FIELDS), _MAX_SCALE)
+            turnover_scale = min(max(_decimals(r["turnover"]) for r in rows), _MAX_SCALE)
+            self._rescale(scale, turnover_scale)
+            incoming = sorted(rows, key=lambda r: r["timestamp"])
+            if not self.ts or incoming[0]["timestamp"] > self.ts[-1]:
+                # 常见情况：尾部追加
+                self._append(incoming)
+            else:
+                merged = {row["timestamp"]: row for row in self.rows(0, len(self))}
+                merged.update((row["timestamp"], row) for row in incoming)
+                for col in self._columns():
+                    del col[:]
+                self._append([merged[ts] for ts in sorted(merged)])
+        self.begin = begin if self.begin is None else min(self.begin, begin)
+        self.end = end if self.end is None else max(self.end, end)
+
+    def _append(self, rows: list[dict]):
+        scale, tscale = self.scale, self.turnover_scale
+        self.ts.extend(int(r["timestamp"]) for r in rows)
+        for name in _PRICE_FIELDS:
+            getattr(self, name).extend(int(Decimal(r[name]).scaleb(scale)) for r in rows)
+        self.volume.extend(int(r["volume"]) for r in rows)
+        self.turnover.extend(int(Decimal(r["turnover"]).scaleb(tscale)) for r in rows)
+
+    # ------------------------------------------------------------------ #
+    # 读取
+    # ------------------------------------------------------------------ #
+    def rows(self, lo: int, hi: int) -> list[dict]:
+        """下标 [lo, hi) 的 K 线，格式与 get_candlesticks 相同。"""
+        scale, tscale = self.scale, self.turnover_scale
+        return [
+            {
+                "timestamp": self.ts[i],
+                "open":      _unscale(self.open[i], scale),
+                "close":     _unscale(self.close[i], scale),
+                "high":      _unscale(self.high[i], scale),
+                "low":       _unscale(self.low[i], scale),
+                "volume":    self.volume[i],
+                "turnover":  _unscale(self.turnover[i], tscale),
+            }
+            for i in range(lo, hi)
+        ]
+
+    def between(self, begin: dt.date, end: dt.date) -> list[dict]:
+        """交易日 [begin, end] 内的 K 线。"""
+        lo_ts, hi_ts = self.bounds(begin, end)
+        return self.rows(bisect_left(self.ts, lo_ts), bisect_left(self.ts, hi_ts))
+
+    def last(self, count: int) -> list[dict]:
+        return self.rows(max(len(self) - count, 0), len(self))
+
+    # ------------------------------------------------------------------ #
+    # 序列化
+    # ------------------------------------------------------------------ #
+    def to_bytes(self) -> bytes:
+        header = {
+            "begin":          self.begin.isoformat() if self.begin else None,
+            "end":            self.end.isoformat() if self.end else None,
+            "scale":          self.scale,
+            "turnover_scale": self.turnover_scale,
+            "count":          len(self),
+        }
+        return json.dumps(header).encode() + b"\n" + b"".join(col.tobytes() for col in self._columns())
+
+    def load_bytes(self, data: bytes):
+        head, _, body = data.partition(b"\n")
+        header = json.loads(head)
+        self.begin = dt.date.fromisoformat(header["begin"]) if header["begin"] else None
+        self.end = dt.date.fromisoformat(header["end"]) if header["end"] else None
+        self.scale = header["scale"]
+        self.turnover_scale = header["turnover_scale"]
+        size = header["count"] * self.ts.itemsize
+        for i, col in enumerate(self._columns()):
+            col.frombytes(body[i * size:(i + 1) * size])
+
+
+class CandleStore:
+    """(标的, 周期) → CandleSeries；按需从磁盘载入，内存中按 LRU 保留。"""
+
+    def __init__(self, directory: str = "", max_series: int = 256):
+        self._dir = Path(directory).expanduser() if directory else None
+        self._max_series = max_series
+        self._series: OrderedDict[tuple[str, str], CandleSeries] = OrderedDict()
+        self._locks: dict[tuple[str, str], asyncio.Lock] = {}
+        # 计数器：由本地返回的 K 线根数 / 为补齐区间发起的上游请求数
+        self.local_bars = 0
+        self.gap_fetches = 0
+        # 为推导除权事件发起的前复权日 K 拉取次数
+        self.factor_fetches = 0
+
+    def lock(self, symbol: str, period: str) -> asyncio.Lock:
+        """同一序列的补齐与写入串行执行，避免并发请求重复拉取同一段区间。"""
+        return self._locks.setdefault((symbol, period), asyncio.Lock())
+
+    def _path(self, symbol: str, period: str) -> Path:
+        return self._dir / symbol.upper() / f"{period}.bin"
+
+    async def series(self, symbol: str, period: str) -> CandleSeries:
+        key = (symbol, period)
+        series = self._series.get(key)
+        if series is not None:
+            self._series.move_to_end(key)
+            return series
+        series = CandleSeries(period, market_timezone(symbol))
+        if self._dir is not None:
+            path = self._path(symbol, period)
+            try:
+                data = await asyncio.to_thread(path.read_bytes)
+                series.load_bytes(data)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"candle store {path} unreadable, starting empty: {e}")
+                series = CandleSeries(period, market_timezone(symbol))
+        self._series[key] = series
+        while len(self._series) > self._max_series:
+            self._series.popitem(last=False)
+        return series
+
+    async def save(self, symbol: str, period: str, series: CandleSeries):
+        if self._dir is None:
+            return
+        path = self._path(symbol, period)
+        data = series.to_bytes()
+        try:
+            await asyncio.to_thread(self._write, path, data)
+        except OSError as e:
+            logger.warning(f"candle store save to {path} failed: {e}")
+
+    @staticmethod
+    def _write(path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    async def load_factors(self, symbol: str) -> dict | None:
+        """读取 symbol 的除权事件表（AdjustmentFactors.to_dict 的格式）；不存在或无法读取时返回 None。"""
+        if self._dir is None:
+            return None
+        path = self._dir / symbol.upper() / "factors.json"
+        try:
+            return json.loads(await asyncio.to_thread(path.read_bytes))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"candle store {path} unreadable, ignoring: {e}")
+            return None
+
+    async def save_factors(self, symbol: str, data: dict):
+        if self._dir is None:
+            return
+        path = self._dir / symbol.upper() / "factors.json"
+        try:
+            await asyncio.to_thread(self._write, path, json.dumps(data).encode())
+        except OSError as e:
+            logger.warning(f"candle store save to {path} failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "path":           str(self._dir) if self._dir else None,
+            "loaded":         len(self._series),
+            "bars":           sum(len(s) for s in self._series.values()),
+            "local_bars":     self.local_bars,
+            "gap_fetches":    self.gap_fetches,
+            "factor_fetches": self.factor_fetches,
+        }
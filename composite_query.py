@@ -0,0 +1,188 @@
+"""
+组合查询：一次请求携带多个子查询，并发执行，相同的子查询（method + params 一致）只执行一次。
+
+POST /api/batch 与 /api/fundamental 共用这里的并发执行逻辑。
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable
+
+from upstream_scheduler import UpstreamBusyError
+
+logger = logging.getLogger(__name__)
+
+
+class QueryError(Exception):
+    """子查询参数错误 / 资源不存在，status 与对应 REST 接口的 HTTP 状态码一致。"""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def _symbols(params: dict) -> list[str]:
+    value = params.get("symbols")
+    if isinstance(value, str):
+        value = value.split(",")
+    symbols = [s.strip() for s in (value or []) if isinstance(s, str) and s.strip()]
+    if not symbols:
+        raise QueryError(400, "symbols 参数不能为空")
+    return symbols
+
+
+def _symbol(params: dict) -> str:
+    value = params.get("symbol")
+    if not isinstance(value, str) or not value.strip():
+        raise QueryError(400, "symbol 参数不能为空")
+    return value.strip()
+
+
+def _int(params: dict, name: str, default: int, low: int, high: int) -> int:
+    try:
+        value = int(params.get(name, default))
+    except (TypeError, ValueError):
+        raise QueryError(400, f"{name} 必须为整数")
+    return min(max(value, low), high)
+
+
+async def fundamental(svc, symbols: list[str]) -> list[dict]:
+    """静态信息 + 估值指标并发查询，按 symbol 合并。"""
+    static, indexes = await asyncio.gather(svc.get_static_info(symbols), svc.get_calc_indexes(symbols))
+    index_map = {item["symbol"]: item for item in indexes}
+    return [{**s, **index_map.get(s["symbol"], {})} for s in static]
+
+
+async def _quotes(svc, p):
+    return await svc.get_quotes(_symbols(p))
+
+
+async def _depth(svc, p):
+    return await svc.get_depth(_symbol(p))
+
+
+async def _depth_metrics(svc, p):
+    return await svc.get_book_metrics(_symbol(p), _int(p, "levels", 5, 1, 10))
+
+
+async def _trades(svc, p):
+    direction = p.get("direction")
+    if direction is not None and direction not in {"Up", "Down", "Neutral"}:
+        raise QueryError(400, "direction 无效，可选: Down, Neutral, Up")
+
+    def _optional_int(name: str) -> int | None:
+        value = p.get(name)
+        try:
+            return int(value) if value is not None else None
+        except (TypeError, ValueError):
+            raise QueryError(400, f"{name} 必须为整数")
+
+    return await svc.get_trades(
+        _symbol(p),
+        _int(p, "count", 100, 1, max(svc.tick_capacity, 1000)),
+        _optional_int("start"),
+        _optional_int("end"),
+        direction,
+        _optional_int("before"),
+    )
+
+
+async def _intraday(svc, p):
+    return await svc.get_intraday(_symbol(p))
+
+
+async def _candlesticks(svc, p):
+    return await svc.get_candlesticks(_symbol(p), str(p.get("period", "day")), _int(p, "count", 90, 1, 1000))
+
+
+async def _static(svc, p):
+    return await svc.get_static_info(_symbols(p))
+
+
+async def _indexes(svc, p):
+    return await svc.get_calc_indexes(_symbols(p))
+
+
+async def _fundamental(svc, p):
+    return await fundamental(svc, _symbols(p))
+
+
+async def _capital(svc, p):
+    return await svc.get_capital_distribution(_symbol(p))
+
+
+async def _bars(svc, p):
+    symbol = _symbol(p)
+    period = str(p.get("period", "1min"))
+    if period not in svc.bar_periods:
+        raise QueryError(400, f"period 无效，可选: {', '.join(svc.bar_periods)}")
+    result = svc.get_bars(symbol, period, _int(p, "count", 100, 1, 1000))
+    if result is None:
+        raise QueryError(404, f"{symbol} 未订阅")
+    return result
+
+
+async def _indicators(svc, p):
+    symbol = _symbol(p)
+    result = svc.get_indicators(symbol)
+    if result is None:
+        raise QueryError(404, f"{symbol} 未订阅或尚无成交")
+    return result
+
+
+async def _market_status(svc, p):
+    market = p.get("market")
+    if market is not None and str(market).upper() not in {"HK", "US", "CN", "SG", "CRYPTO"}:
+        raise QueryError(400, "market 参数无效，可选值: HK / US / CN / SG / Crypto")
+    return svc.get_market_status(market)
+
+
+# method → (QuoteService, params) → 协程；参数与对应 REST 接口的 query 参数同名
+QUERY_METHODS: dict[str, Callable[[Any, dict], Awaitable[Any]]] = {
+    "quotes":        _quotes,
+    "depth":         _depth,
+    "depth_metrics": _depth_metrics,
+    "trades":        _trades,
+    "intraday":      _intraday,
+    "candlesticks":  _candlesticks,
+    "static":        _static,
+    "indexes":       _indexes,
+    "fundamental":   _fundamental,
+    "capital":       _capital,
+    "bars":          _bars,
+    "indicators":    _indicators,
+    "market_status": _market_status,
+}
+
+
+async def _run_one(svc, method: str, params: dict) -> dict:
+    handler = QUERY_METHODS.get(method)
+    if handler is None:
+        return {"status": 400, "error": f"未知 method: {method}"}
+    try:
+        return {"status": 200, "data": await handler(svc, params)}
+    except QueryError as e:
+        return {"status": e.status, "error": e.detail}
+    except UpstreamBusyError:
+        return {"status": 503, "error": "upstream busy, retry later"}
+    except Exception as e:
+        logger.exception("batch query %s failed: %s", method, e)
+        return {"status": 500, "error": "internal server error"}
+
+
+async def run_queries(svc, queries: list[tuple[str, str, dict]]) -> dict[str, dict]:
+    """
+    并发执行 [(id, method, params)]，返回 {id: {"status", "data" | "error"}}。
+    method 与 params 完全相同的子查询只执行一次，结果共享给各自的 id。
+    单个子查询失败不影响其他子查询。
+    """
+    tasks: dict[str, asyncio.Task] = {}
+    keyed: list[tuple[str, str]] = []
+    for qid, method, params in queries:
+        key = method + ":" + json.dumps(params, sort_keys=True, default=str)
+        if key not in tasks:
+            tasks[key] = asyncio.ensure_future(_run_one(svc, method, params))
+        keyed.append((qid, key))
+    await asyncio.gather(*tasks.values())
+    return {qid: tasks[key].result() for qid, key in keyed}
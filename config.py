@@ -17,3 +17,68 @@ CORS_ALLOW_ORIGINS = [
 	for o in os.getenv("CORS_ALLOW_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000").split(",")
 	if o.strip()
 ]
+
+# 行情订阅：引用计数归零后延迟向上游退订的宽限期（秒），0 表示立即退订
+SUBSCRIPTION_RELEASE_GRACE = float(os.getenv("SUBSCRIPTION_RELEASE_GRACE", "30"))
+
+# WebSocket 每个连接的出站队列上限，以及队列满时的策略：drop_oldest / conflate / disconnect
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "1000"))
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+
+# 行情推送缓冲：SDK 回调写入的环形缓冲容量，以及分发协程每批处理的事件数
+PUSH_INGEST_CAPACITY = int(os.getenv("PUSH_INGEST_CAPACITY", "65536"))
+PUSH_INGEST_BATCH = int(os.getenv("PUSH_INGEST_BATCH", "512"))
+
+# quote / depth 推送合并：每个标的只保留最新值，按该间隔（毫秒）刷出；0 表示关闭
+PUSH_CONFLATE_MS = int(os.getenv("PUSH_CONFLATE_MS", "0"))
+
+# WebSocket 增量推送（delta 选项）下，每个标的强制下发完整关键帧的间隔（秒）
+WS_DELTA_KEYFRAME_SECONDS = float(os.getenv("WS_DELTA_KEYFRAME_SECONDS", "30"))
+
+# 已订阅标的的 REST 行情直接读推送缓存；超过该秒数未收到推送则回源上游
+QUOTE_CACHE_MAX_AGE = float(os.getenv("QUOTE_CACHE_MAX_AGE", "10"))
+
+# 由逐笔成交推送聚合的日内 K 线周期（可选 1s / 1min / 5min / 15min），以及每个周期保留的已收盘根数
+BAR_PERIODS = [p.strip() for p in os.getenv("BAR_PERIODS", "1s,1min,5min,15min").split(",") if p.strip()]
+BAR_HISTORY = int(os.getenv("BAR_HISTORY", "500"))
+
+# 已订阅标的逐笔成交环形缓冲的容量（笔 / 标的），写满后覆盖最旧的成交
+TICK_BUFFER_CAPACITY = int(os.getenv("TICK_BUFFER_CAPACITY", "50000"))
+
+# 流式指标：成交价 EMA 的 span（笔），滚动成交量窗口（秒）
+INDICATOR_EMA_SPANS = [int(x) for x in os.getenv("INDICATOR_EMA_SPANS", "12,26").split(",") if x.strip()]
+INDICATOR_VOLUME_WINDOWS = [int(x) for x in os.getenv("INDICATOR_VOLUME_WINDOWS", "60,300").split(",") if x.strip()]
+
+# 上游请求缓存：各接口结果缓存时间（秒，0 表示只合并并发请求、不缓存），以及每个接口的最大缓存条目数
+CACHE_TTL_QUOTE = float(os.getenv("CACHE_TTL_QUOTE", "1"))
+CACHE_TTL_STATIC = float(os.getenv("CACHE_TTL_STATIC", "0"))
+CACHE_TTL_INDEXES = float(os.getenv("CACHE_TTL_INDEXES", "5"))
+CACHE_TTL_CAPITAL = float(os.getenv("CACHE_TTL_CAPITAL", "5"))
+CACHE_TTL_RESAMPLE = float(os.getenv("CACHE_TTL_RESAMPLE", "5"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# 静态信息目录：JSON 快照文件路径（留空则仅保存在内存），以及条目有效期（小时），过期后自动刷新
+STATIC_CATALOG_PATH = os.getenv("STATIC_CATALOG_PATH", "~/.jiang_equity_request_static_catalog.json")
+STATIC_CATALOG_MAX_AGE_HOURS = float(os.getenv("STATIC_CATALOG_MAX_AGE_HOURS", "24"))
+
+# 本地市场日历（交易时段 + 交易日）的刷新间隔（小时）
+MARKET_CALENDAR_REFRESH_HOURS = float(os.getenv("MARKET_CALENDAR_REFRESH_HOURS", "24"))
+
+# 本地历史 K 线库：已收盘的日 K / 分钟 K 的存储目录（留空则仅保存在内存中），以及内存中最多保留的序列数
+CANDLE_STORE_DIR = os.getenv("CANDLE_STORE_DIR", "~/.jiang_equity_request_candles")
+CANDLE_STORE_MAX_SERIES = int(os.getenv("CANDLE_STORE_MAX_SERIES", "256"))
+
+# 多标的上游请求（行情快照 / 静态信息 / 估值指标）的分片大小，以及同时在途的分片数上限（长区间 K 线的分窗口拉取另按此上限使用独立的槽位）
+UPSTREAM_BATCH_SIZE = int(os.getenv("UPSTREAM_BATCH_SIZE", "500"))
+UPSTREAM_CONCURRENCY = int(os.getenv("UPSTREAM_CONCURRENCY", "4"))
+
+# 上游限速：各接口族的 "每秒次数/桶容量"（quote / history / subscribe / trade，未列出的取默认值），
+# 以及交互请求 / 后台任务在限速队列中的最长等待时间（秒），超时返回 503
+UPSTREAM_RATE_LIMITS = {
+    name.strip(): tuple(float(x) for x in spec.split("/"))
+    for name, spec in (
+        item.split("=") for item in os.getenv("UPSTREAM_RATE_LIMITS", "quote=8/10,history=2/4").split(",") if item.strip()
+    )
+}
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "5"))
+UPSTREAM_BACKGROUND_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_BACKGROUND_QUEUE_TIMEOUT", "120"))
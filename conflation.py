@@ -0,0 +1,63 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# 只关心最新值、允许合并的推送类型；trades / candlestick 逐条下发，从不丢弃
+CONFLATABLE_TYPES = frozenset({"quote", "depth", "book_metrics", "indicators"})
+
+# (kind, symbol, value) → 协程
+FlushHandler = Callable[[str, str, Any], Awaitable[None]]
+
+
+class Conflator:
+    """按 (kind, symbol) 只保留最新值，每隔 interval 秒统一刷出一次。"""
+
+    def __init__(self, flush: FlushHandler, interval: float):
+        self._flush = flush
+        self._interval = interval
+        self._latest: dict[tuple[str, str], Any] = {}
+        self._task: asyncio.Task | None = None
+        # 计数器
+        self.offered = 0
+        self.flushed = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def offer(self, kind: str, symbol: str, value: Any):
+        """记录最新值，覆盖同一 (kind, symbol) 尚未刷出的旧值。"""
+        self._latest[(kind, symbol)] = value
+        self.offered += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            if not self._latest:
+                continue
+            batch, self._latest = self._latest, {}
+            for (kind, symbol), value in batch.items():
+                try:
+                    await self._flush(kind, symbol, value)
+                except Exception as e:
+                    logger.warning(f"conflated flush ({kind} {symbol}) failed: {e}")
+                self.flushed += 1
+
+    def stats(self) -> dict:
+        return {
+            "interval_ms": int(self._interval * 1000),
+            "pending":     len(self._latest),
+            "offered":     self.offered,
+            "flushed":     self.flushed,
+            "conflated":   self.offered - self.flushed - len(self._latest),
+        }
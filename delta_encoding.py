@@ -0,0 +1,69 @@
+"""
+按连接的增量推送编码。
+
+开启 delta 选项的连接，quote / depth 只下发相对该连接上一次已发送状态的变化：
+  quote —— data 只包含取值变化的字段
+  depth —— asks / bids 为变化档位的 [index, level] 列表，n_asks / n_bids 为当前档数
+增量消息带 "delta": true。每个标的在订阅后的第一条、以及距上次完整消息超过
+keyframe_interval 秒时下发完整消息（关键帧），客户端据此校正本地状态。
+"""
+from wire_format import Envelope
+
+DELTA_TYPES = frozenset({"quote", "depth"})
+
+
+def _quote_delta(prev: dict, cur: dict) -> dict | None:
+    changed = {k: v for k, v in cur.items() if prev.get(k) != v}
+    return changed or None
+
+
+def _depth_delta(prev: dict, cur: dict) -> dict | None:
+    diff = {}
+    for side, count_key in (("asks", "n_asks"), ("bids", "n_bids")):
+        before = prev.get(side, [])
+        after = cur.get(side, [])
+        changes = [[i, lv] for i, lv in enumerate(after) if i >= len(before) or before[i] != lv]
+        if changes or len(before) != len(after):
+            diff[side] = changes
+            diff[count_key] = len(after)
+    return diff or None
+
+
+_DIFFS = {
+    "quote": _quote_delta,
+    "depth": _depth_delta,
+}
+
+
+class DeltaEncoder:
+    """单个连接的增量编码状态：(type, symbol) → 已发送给该连接的最新 data。"""
+
+    def __init__(self, keyframe_interval: float):
+        self._keyframe_interval = keyframe_interval
+        self._last: dict[tuple[str, str], dict] = {}
+        self._keyframe_at: dict[tuple[str, str], float] = {}
+
+    def reset(self, symbols):
+        """清除这些标的的状态，下一条推送以关键帧下发（重新订阅时调用）。"""
+        symbols = set(symbols)
+        for key in [k for k in self._last if k[1] in symbols]:
+            del self._last[key]
+            self._keyframe_at.pop(key, None)
+
+    def transform(self, envelope: Envelope, now: float) -> Envelope | None:
+        """返回实际要下发的消息：原消息（关键帧 / 非增量类型）、增量消息，或 None（无变化）。"""
+        message = envelope.message
+        kind = message.get("type")
+        if kind not in DELTA_TYPES:
+            return envelope
+        key = (kind, message.get("symbol"))
+        data = message.get("data", {})
+        prev = self._last.get(key)
+        self._last[key] = data
+        if prev is None or now - self._keyframe_at.get(key, 0.0) >= self._keyframe_interval:
+            self._keyframe_at[key] = now
+            return envelope
+        diff = _DIFFS[kind](prev, data)
+        if diff is None:
+            return None
+        return Envelope({"type": kind, "symbol": key[1], "delta": True, "data": diff})
@@ -0,0 +1,98 @@
+"""
+已订阅标的的流式技术指标，随逐笔成交推送增量更新，每笔成交 O(1)（均摊）。
+
+  vwap   —— 当前交易日（市场时区）的成交量加权均价 Σ(价×量) / Σ量，累计成交量 / 成交额同样按交易日重置
+  volume —— 滚动窗口成交量：截至当前时间的前 N 秒内成交量之和（按秒分桶）
+  ema    —— 成交价的指数移动平均，span 为 N 笔，alpha = 2 / (N + 1)
+"""
+import datetime as dt
+from collections import deque
+from decimal import Decimal
+
+_QUANT = Decimal("0.0001")
+
+
+class _RollingVolume:
+    """按秒分桶的滚动成交量：桶随时间推进出队，维护窗口内总和。"""
+
+    __slots__ = ("window", "buckets", "total")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.buckets: deque[list[int]] = deque()
+        self.total = 0
+
+    def add(self, ts: int, volume: int):
+        if self.buckets and self.buckets[-1][0] >= ts:
+            # 同一秒（或迟到）的成交计入最新的桶
+            self.buckets[-1][1] += volume
+        else:
+            self.buckets.append([ts, volume])
+        self.total += volume
+        self.expire(self.buckets[-1][0])
+
+    def expire(self, now: float):
+        """移出 now 前 window 秒之外的桶。"""
+        cutoff = now - self.window
+        while self.buckets and self.buckets[0][0] <= cutoff:
+            self.total -= self.buckets.popleft()[1]
+
+
+class StreamingIndicators:
+    """单个标的的指标状态。"""
+
+    __slots__ = ("tz", "day_end", "volume", "turnover", "last_price", "timestamp", "windows", "spans", "alphas", "emas")
+
+    def __init__(self, ema_spans: list[int], volume_windows: list[int], tz: dt.tzinfo = dt.timezone.utc):
+        # 交易日按市场时区的自然日划分；day_end 为当前交易日结束（次日零点）的 Unix 秒
+        self.tz = tz
+        self.day_end = 0
+        self.volume = 0
+        self.turnover = Decimal(0)
+        self.last_price: Decimal | None = None
+        self.timestamp = 0
+        self.windows = [_RollingVolume(w) for w in volume_windows]
+        self.spans = ema_spans
+        self.alphas = [Decimal(2) / (span + 1) for span in ema_spans]
+        self.emas: list[Decimal | None] = [None] * len(ema_spans)
+
+    def _roll_day(self, ts: float):
+        """ts 已进入新的交易日时重置当日累计量。"""
+        if ts < self.day_end:
+            return
+        if self.day_end:
+            self.volume = 0
+            self.turnover = Decimal(0)
+        day = dt.datetime.fromtimestamp(ts, self.tz).date() + dt.timedelta(days=1)
+        self.day_end = int(dt.datetime.combine(day, dt.time(), self.tz).timestamp())
+
+    def update(self, ts: int, price: Decimal, volume: int):
+        self._roll_day(ts)
+        self.volume += volume
+        self.turnover += price * volume
+        self.last_price = price
+        self.timestamp = max(self.timestamp, ts)
+        for window in self.windows:
+            window.add(ts, volume)
+        for i, alpha in enumerate(self.alphas):
+            prev = self.emas[i]
+            self.emas[i] = price if prev is None else prev + alpha * (price - prev)
+
+    def snapshot(self, now: float) -> dict:
+        """now 为当前 Unix 时间：滚动窗口按当前时间过期，跨过交易日后累计量归零。"""
+        self._roll_day(now)
+        for window in self.windows:
+            window.expire(now)
+        vwap = self.turnover / self.volume if self.volume else None
+        return {
+            "timestamp":  self.timestamp,
+            "last_price": str(self.last_price) if self.last_price is not None else None,
+            "vwap":       str(vwap.quantize(_QUANT)) if vwap is not None else None,
+            "volume":     self.volume,
+            "turnover":   str(self.turnover),
+            "rolling_volume": {f"{w.window}s": w.total for w in self.windows},
+            "ema": {
+                str(span): str(ema.quantize(_QUANT)) if ema is not None else None
+                for span, ema in zip(self.spans, self.emas)
+            },
+        }
@@ -12,7 +12,7 @@ import sys
 from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 
 # ---- 优先从 config.py 注入环境变量（硬编码凭证），再初始化 SDK ----
@@ -24,12 +24,15 @@ os.environ.setdefault("LONGPORT_ACCESS_TOKEN", config.LONGPORT_ACCESS_TOKEN)
 
 from quote_service import QuoteService
 from trade_service import TradeService
+from upstream_scheduler import UpstreamScheduler, background
 from websocket_manager import WebSocketManager
+from wire_format import FORMAT_JSON, WIRE_FORMATS
 from routers import quotes as quotes_router
 from routers import watchlist as watchlist_router
 from routers import fundamental as fundamental_router
 from routers import assets as assets_router
 from routers import market as market_router
+from routers import batch as batch_router
 
 # --------------------------------------------------------------------------- #
 # 日志
@@ -46,26 +49,72 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- startup ---
-    ws_manager = WebSocketManager()
+    async def release_owner(websocket: WebSocket):
+        # 释放该连接持有的订阅引用，无人订阅的标的在宽限期后向上游退订
+        await svc.release_owner(websocket)
+
+    ws_manager = WebSocketManager(
+        max_queue=config.WS_SEND_QUEUE_SIZE,
+        policy=config.WS_SLOW_CONSUMER_POLICY,
+        delta_keyframe_interval=config.WS_DELTA_KEYFRAME_SECONDS,
+        on_disconnect=release_owner,
+    )
+
+    # QuoteService 与 TradeService 的全部上游调用共用一个限速调度器
+    scheduler = UpstreamScheduler(
+        config.UPSTREAM_RATE_LIMITS,
+        queue_timeout=config.UPSTREAM_QUEUE_TIMEOUT,
+        background_queue_timeout=config.UPSTREAM_BACKGROUND_QUEUE_TIMEOUT,
+    )
 
     async def push_callback(msg_type: str, symbol: str, data: dict):
-        await ws_manager.broadcast({"type": msg_type, "symbol": symbol, "data": data})
+        await ws_manager.publish(symbol, {"type": msg_type, "symbol": symbol, "data": data})
 
-    svc = QuoteService(push_callback)
+    svc = QuoteService(
+        push_callback,
+        release_grace=config.SUBSCRIPTION_RELEASE_GRACE,
+        ingest_capacity=config.PUSH_INGEST_CAPACITY,
+        ingest_batch=config.PUSH_INGEST_BATCH,
+        conflate_interval=config.PUSH_CONFLATE_MS / 1000,
+        quote_cache_max_age=config.QUOTE_CACHE_MAX_AGE,
+        bar_periods=config.BAR_PERIODS,
+        bar_history=config.BAR_HISTORY,
+        tick_capacity=config.TICK_BUFFER_CAPACITY,
+        ema_spans=config.INDICATOR_EMA_SPANS,
+        volume_windows=config.INDICATOR_VOLUME_WINDOWS,
+        cache_ttls={
+            "quote":   config.CACHE_TTL_QUOTE,
+            "static":  config.CACHE_TTL_STATIC,
+            "indexes": config.CACHE_TTL_INDEXES,
+            "capital": config.CACHE_TTL_CAPITAL,
+            "resample": config.CACHE_TTL_RESAMPLE,
+        },
+        cache_max_entries=config.CACHE_MAX_ENTRIES,
+        static_catalog_path=config.STATIC_CATALOG_PATH,
+        static_catalog_max_age=config.STATIC_CATALOG_MAX_AGE_HOURS * 3600,
+        calendar_refresh_interval=config.MARKET_CALENDAR_REFRESH_HOURS * 3600,
+        upstream_batch_size=config.UPSTREAM_BATCH_SIZE,
+        upstream_concurrency=config.UPSTREAM_CONCURRENCY,
+        scheduler=scheduler,
+        candle_store_dir=config.CANDLE_STORE_DIR,
+        candle_store_max_series=config.CANDLE_STORE_MAX_SERIES,
+    )
     await svc.start()
 
-    trade_svc = TradeService()
+    trade_svc = TradeService(scheduler)
     await trade_svc.start()
 
     app.state.quote_service = svc
     app.state.trade_service = trade_svc
     app.state.ws_manager = ws_manager
+    app.state.upstream_scheduler = scheduler
     logger.info("JiangEquityRequestAPI backend started.")
 
     yield  # 应用运行阶段
 
     # --- shutdown ---
     logger.info("JiangEquityRequestAPI backend shutting down.")
+    await svc.stop()
 
 
 # --------------------------------------------------------------------------- #
@@ -80,11 +129,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def upstream_priority(request: Request, call_next):
+    """带 X-Priority: background 头的请求（批量导出等）发起的上游调用按后台优先级调度。"""
+    if request.headers.get("x-priority", "").lower() == "background":
+        with background():
+            return await call_next(request)
+    return await call_next(request)
+
+
 app.include_router(quotes_router.router)
 app.include_router(watchlist_router.router)
 app.include_router(fundamental_router.router)
 app.include_router(assets_router.router)
 app.include_router(market_router.router)
+app.include_router(batch_router.router)
 
 # --------------------------------------------------------------------------- #
 # 基础路由
@@ -95,6 +155,7 @@ async def health():
     resp = {
         "status": "ok",
         "subscribed": svc.subscribed_symbols,
+        "subscription_refs": svc.subscription_refs,
         "ws_clients": app.state.ws_manager.client_count,
     }
     if config.PUBLIC_BASE_URL:
@@ -102,6 +163,25 @@ async def health():
     return resp
 
 
+@app.get("/stats")
+async def stats():
+    """运行时指标：推送缓冲积压/溢出，各 WebSocket 连接的出站队列深度、发送与丢弃计数。"""
+    return {
+        "ingest": app.state.quote_service.ingest_stats,
+        "conflation": app.state.quote_service.conflation_stats,
+        "quote_cache": app.state.quote_service.quote_cache_stats,
+        "request_cache": app.state.quote_service.request_cache_stats,
+        "upstream_chunks": app.state.quote_service.upstream_chunk_stats,
+        "upstream": app.state.upstream_scheduler.stats(),
+        "static_catalog": app.state.quote_service.static_catalog_stats,
+        "market_calendar": app.state.quote_service.market_calendar_stats,
+        "candle_store": app.state.quote_service.candle_store_stats,
+        "bars": app.state.quote_service.bar_stats,
+        "ticks": app.state.quote_service.tick_stats,
+        "ws": app.state.ws_manager.stats(),
+    }
+
+
 # --------------------------------------------------------------------------- #
 # WebSocket 实时行情通道
 # --------------------------------------------------------------------------- #
@@ -110,7 +190,12 @@ async def ws_quotes(websocket: WebSocket):
     manager: WebSocketManager = app.state.ws_manager
     svc: QuoteService = app.state.quote_service
 
-    await manager.connect(websocket)
+    # 线上格式在连接时协商：/ws/quotes?format=json|binary
+    fmt = websocket.query_params.get("format", FORMAT_JSON)
+    if fmt not in WIRE_FORMATS:
+        await websocket.close(code=1003)
+        return
+    await manager.connect(websocket, fmt)
     try:
         while True:
             raw = await websocket.receive_text()
@@ -120,36 +205,63 @@ async def ws_quotes(websocket: WebSocket):
                 symbols = msg.get("symbols", [])
 
                 if action == "subscribe" and symbols:
-                    await svc.subscribe(symbols)
-                    await websocket.send_text(json.dumps({
+                    max_rate = msg.get("max_rate")
+                    if max_rate is not None and (
+                        isinstance(max_rate, bool) or not isinstance(max_rate, (int, float)) or max_rate <= 0
+                    ):
+                        await manager.send(websocket, {"type": "error", "message": "max_rate 必须为正数"})
+                        continue
+                    await svc.subscribe(symbols, owner=websocket)
+                    await manager.subscribe(websocket, symbols, max_rate=max_rate)
+                    await manager.send(websocket, {
                         "type": "ack",
                         "action": "subscribe",
                         "symbols": symbols,
-                        "subscribed": svc.subscribed_symbols,
-                    }))
+                        "max_rate": max_rate,
+                        "subscribed": manager.symbols_of(websocket),
+                    })
 
                 elif action == "unsubscribe" and symbols:
-                    await svc.unsubscribe(symbols)
-                    await websocket.send_text(json.dumps({
+                    await svc.unsubscribe(symbols, owner=websocket)
+                    await manager.unsubscribe(websocket, symbols)
+                    await manager.send(websocket, {
                         "type": "ack",
                         "action": "unsubscribe",
                         "symbols": symbols,
-                        "subscribed": svc.subscribed_symbols,
-                    }))
+                        "subscribed": manager.symbols_of(websocket),
+                    })
+
+                elif action == "options":
+                    batch = msg.get("batch")
+                    delta = msg.get("delta")
+                    channels = msg.get("channels")
+                    options = manager.set_options(
+                        websocket,
+                        batch=bool(batch) if batch is not None else None,
+                        delta=bool(delta) if delta is not None else None,
+                        channels=list(channels) if isinstance(channels, list) else None,
+                    )
+                    await manager.send(websocket, {
+                        "type": "ack",
+                        "action": "options",
+                        "options": options,
+                    })
 
                 else:
-                    await websocket.send_text(json.dumps({
+                    await manager.send(websocket, {
                         "type": "error",
                         "message": f"未知 action: {action}",
-                    }))
+                    })
 
             except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({"type": "error", "message": "JSON 解析失败"}))
+                await manager.send(websocket, {"type": "error", "message": "JSON 解析失败"})
 
     except WebSocketDisconnect:
-        await manager.disconnect(websocket)
+        pass
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
+    finally:
+        # 同时释放该连接持有的订阅引用（见 lifespan 中的 on_disconnect）
         await manager.disconnect(websocket)
 
 
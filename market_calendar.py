@@ -0,0 +1,226 @@
+"""
+本地市场日历：缓存各市场交易时段与约一年的交易日 / 半日市，
+在本地计算 "当前是否开市 / 所处时段 / 下次开盘 / 下次收盘"，不访问上游。
+
+交易时段为交易所当地时间；结束时间早于开始时间的时段（如夜盘）视为跨越午夜。
+半日市只保留在提前收市时间之前的部分（港股 / 新加坡 12:00，美股 13:00）。
+"""
+import datetime as dt
+from bisect import bisect_left, bisect_right
+from zoneinfo import ZoneInfo
+
+MARKET_TIMEZONES: dict[str, ZoneInfo] = {
+    "HK":     ZoneInfo("Asia/Hong_Kong"),
+    "US":     ZoneInfo("America/New_York"),
+    "CN":     ZoneInfo("Asia/Shanghai"),
+    "SG":     ZoneInfo("Asia/Singapore"),
+    "CRYPTO": ZoneInfo("UTC"),
+}
+
+# 标的代码后缀 → 市场
+SUFFIX_MARKETS: dict[str, str] = {"HK": "HK", "US": "US", "SH": "CN", "SZ": "CN", "SG": "SG"}
+
+# 半日市提前收市时间（当地时间）
+HALF_DAY_CLOSE: dict[str, dt.time] = {
+    "HK": dt.time(12, 0),
+    "US": dt.time(13, 0),
+    "SG": dt.time(12, 0),
+}
+
+# 正常交易时段的类型名：SDK 的 TradeSession.Intraday；NormalTrade 为旧版文档中的名称，一并接受
+REGULAR_SESSIONS = frozenset({"Intraday", "NormalTrade"})
+
+# 查找下次开盘 / 收盘时向后搜索的最大天数
+_LOOKAHEAD_DAYS = 14
+
+
+def symbol_market(symbol: str) -> str | None:
+    """由标的代码后缀得到市场，如 700.HK → HK、600519.SH → CN；无法识别时返回 None。"""
+    return SUFFIX_MARKETS.get(symbol.rsplit(".", 1)[-1].upper())
+
+
+def _parse_hhmm(value: str) -> dt.time:
+    hour, minute = value.split(":")[:2]
+    return dt.time(int(hour), int(minute))
+
+
+class _MarketDays:
+    """单个市场的交易日索引：升序的日期序数数组 + 半日市集合 + 覆盖区间。"""
+
+    __slots__ = ("ordinals", "half", "begin", "end")
+
+    def __init__(self, begin: dt.date, end: dt.date, trading: list[dt.date], half: list[dt.date]):
+        self.begin = begin
+        self.end = end
+        self.half = {d.toordinal() for d in half}
+        self.ordinals = sorted({d.toordinal() for d in trading} | self.half)
+
+    def covers(self, begin: dt.date, end: dt.date) -> bool:
+        return self.begin <= begin and end <= self.end
+
+    def is_trading_day(self, day: dt.date) -> bool | None:
+        """交易日（含半日市）返回 True；超出缓存范围返回 None。"""
+        if not self.begin <= day <= self.end:
+            return None
+        o = day.toordinal()
+        i = bisect_left(self.ordinals, o)
+        return i < len(self.ordinals) and self.ordinals[i] == o
+
+    def between(self, begin: dt.date, end: dt.date) -> tuple[list[dt.date], list[dt.date]]:
+        """[begin, end] 内的 (正常交易日, 半日市)。"""
+        lo = bisect_left(self.ordinals, begin.toordinal())
+        hi = bisect_right(self.ordinals, end.toordinal())
+        days = self.ordinals[lo:hi]
+        return (
+            [dt.date.fromordinal(o) for o in days if o not in self.half],
+            [dt.date.fromordinal(o) for o in days if o in self.half],
+        )
+
+
+class MarketCalendar:
+    """各市场的交易时段与交易日缓存，以及基于它们的本地开闭市判断。"""
+
+    def __init__(self):
+        # 上游返回的时段列表（与 GET /api/market/sessions 的响应相同）
+        self._sessions: list[dict] = []
+        # market → [(开始时间, 结束时间, 时段类型)]
+        self._parsed: dict[str, list[tuple[dt.time, dt.time, str]]] = {}
+        self._days: dict[str, _MarketDays] = {}
+        self.sessions_loaded_at: dt.datetime | None = None
+        self.days_loaded_at: dt.datetime | None = None
+
+    # ------------------------------------------------------------------ #
+    # 写入
+    # ------------------------------------------------------------------ #
+    def set_sessions(self, markets: list[dict]):
+        """写入 get_trading_session 的返回结果。"""
+        self._sessions = markets
+        self._parsed = {
+            m["market"].upper(): [
+                (_parse_hhmm(s["begin_time"]), _parse_hhmm(s["end_time"]), s["trade_session"])
+                for s in m["trade_sessions"]
+            ]
+            for m in markets
+        }
+        self.sessions_loaded_at = dt.datetime.now(dt.timezone.utc)
+
+    def set_trading_days(self, market: str, begin: dt.date, end: dt.date,
+                         trading: list[dt.date], half: list[dt.date]):
+        self._days[market.upper()] = _MarketDays(begin, end, trading, half)
+        self.days_loaded_at = dt.datetime.now(dt.timezone.utc)
+
+    # ------------------------------------------------------------------ #
+    # 查询
+    # ------------------------------------------------------------------ #
+    @property
+    def has_sessions(self) -> bool:
+        return bool(self._sessions)
+
+    def sessions(self) -> list[dict]:
+        return self._sessions
+
+    def trading_days(self, market: str, begin: dt.date, end: dt.date) -> tuple[list[dt.date], list[dt.date]] | None:
+        """缓存覆盖 [begin, end] 时返回 (交易日, 半日市)，否则返回 None。"""
+        days = self._days.get(market.upper())
+        if days is None or not days.covers(begin, end):
+            return None
+        return days.between(begin, end)
+
+    def regular_minutes(self, market: str) -> int | None:
+        """一个完整交易日内正常交易时段（Intraday）的总分钟数；时段未加载时返回 None。"""
+        sessions = self._parsed.get(market.upper())
+        if not sessions:
+            return None
+        total = 0
+        for begin, end, name in sessions:
+            if name in REGULAR_SESSIONS:
+                minutes = (end.hour * 60 + end.minute) - (begin.hour * 60 + begin.minute)
+                total += minutes if minutes > 0 else minutes + 24 * 60
+        return total or None
+
+    def _is_trading_day(self, market: str, day: dt.date) -> tuple[bool, bool]:
+        """(是否交易日, 是否来自缓存)；缓存未覆盖时按周一至周五估计（加密货币每天交易）。"""
+        days = self._days.get(market)
+        known = days.is_trading_day(day) if days is not None else None
+        if known is not None:
+            return known, True
+        return market == "CRYPTO" or day.weekday() < 5, False
+
+    def _intervals(self, market: str, day: dt.date) -> list[tuple[dt.datetime, dt.datetime, str]]:
+        """某个交易日的各时段（当地时间 aware datetime）；非交易日为空。"""
+        if not self._is_trading_day(market, day)[0]:
+            return []
+        tz = MARKET_TIMEZONES[market]
+        days = self._days.get(market)
+        half_close = HALF_DAY_CLOSE.get(market) if days is not None and day.toordinal() in days.half else None
+        result = []
+        for begin, end, name in self._parsed.get(market, []):
+            start = dt.datetime.combine(day, begin, tz)
+            stop = dt.datetime.combine(day + dt.timedelta(days=1) if end <= begin else day, end, tz)
+            if half_close is not None:
+                stop = min(stop, dt.datetime.combine(day, half_close, tz))
+                if stop <= start:
+                    continue
+            result.append((start, stop, name))
+        return result
+
+    def session_bounds(self, market: str, day: dt.date) -> list[tuple[int, int]]:
+        """某个交易日各交易时段的 (开始, 结束) Unix 秒（半日市已截短）；非交易日或时段未加载时为空。"""
+        return [(int(start.timestamp()), int(stop.timestamp())) for start, stop, _ in self._intervals(market.upper(), day)]
+
+    def status(self, market: str, now: dt.datetime | None = None) -> dict:
+        """
+        市场当前状态：
+          open        —— 当前是否处于任一交易时段
+          session     —— 当前所处时段类型（休市为 null）
+          next_open / next_close —— 下一次正常交易时段（Intraday）的开始 / 结束时间
+        """
+        market = market.upper()
+        tz = MARKET_TIMEZONES[market]
+        now = (now or dt.datetime.now(dt.timezone.utc)).astimezone(tz)
+        today = now.date()
+        is_trading_day, covered = self._is_trading_day(market, today)
+        days = self._days.get(market)
+
+        session = None
+        for offset in (-1, 0):
+            for start, stop, name in self._intervals(market, today + dt.timedelta(days=offset)):
+                if start <= now < stop:
+                    session = name
+
+        next_open = next_close = None
+        for offset in range(0, _LOOKAHEAD_DAYS):
+            for start, stop, name in self._intervals(market, today + dt.timedelta(days=offset)):
+                if name not in REGULAR_SESSIONS:
+                    continue
+                if next_open is None and start > now:
+                    next_open = start
+                if next_close is None and stop > now:
+                    next_close = stop
+            if next_open is not None and next_close is not None:
+                break
+
+        return {
+            "market":         market,
+            "local_time":     now.isoformat(timespec="seconds"),
+            "open":           session is not None,
+            "session":        session,
+            "is_trading_day": is_trading_day,
+            "is_half_day":    days is not None and today.toordinal() in days.half,
+            "calendar_known": covered,
+            "next_open":      next_open.isoformat() if next_open else None,
+            "next_close":     next_close.isoformat() if next_close else None,
+        }
+
+    def is_open(self, market: str, now: dt.datetime | None = None) -> bool:
+        return self.status(market, now)["open"]
+
+    def stats(self) -> dict:
+        return {
+            "sessions_loaded_at": self.sessions_loaded_at.isoformat(timespec="seconds") if self.sessions_loaded_at else None,
+            "days_loaded_at":     self.days_loaded_at.isoformat(timespec="seconds") if self.days_loaded_at else None,
+            "trading_days": {
+                market: {"begin": d.begin.isoformat(), "end": d.end.isoformat(), "days": len(d.ordinals)}
+                for market, d in self._days.items()
+            },
+        }
@@ -45,6 +45,20 @@ class SubscribeRequest(BaseModel):
     symbols: list[str]
 
 
+class QuotesRequest(BaseModel):
+    symbols: list[str]
+
+
+class BatchQuery(BaseModel):
+    id: str
+    method: str        # 见 composite_query.QUERY_METHODS
+    params: dict = {}
+
+
+class BatchRequest(BaseModel):
+    queries: list[BatchQuery]
+
+
 class WatchlistAddRequest(BaseModel):
     symbol: str
 
@@ -0,0 +1,101 @@
+"""
+本地盘口状态与衍生微观结构指标。
+
+每个已订阅标的维护一份由 PushDepth 更新的盘口，价格以 int64 缩放整数、
+量与笔数以整型存入 array，避免为每档保存 Decimal / dict 对象。
+"""
+from array import array
+from decimal import Decimal, InvalidOperation
+
+_MAX_SCALE = 9
+
+
+def _decimals(value) -> int:
+    try:
+        exponent = Decimal(str(value)).as_tuple().exponent
+    except InvalidOperation:
+        return 0
+    return -exponent if isinstance(exponent, int) and exponent < 0 else 0
+
+
+class OrderBook:
+    """单个标的的盘口：asks / bids 按档位顺序保存 价格(缩放整数) / 量 / 笔数。"""
+
+    __slots__ = ("scale", "ask_px", "ask_vol", "ask_num", "bid_px", "bid_vol", "bid_num")
+
+    def __init__(self):
+        self.scale = 0
+        self.ask_px = array("q")
+        self.ask_vol = array("q")
+        self.ask_num = array("q")
+        self.bid_px = array("q")
+        self.bid_vol = array("q")
+        self.bid_num = array("q")
+
+    def update(self, event):
+        """用 PushDepth / depth() 返回对象（含 asks / bids 档位列表）整体替换盘口。"""
+        asks = getattr(event, "asks", []) or []
+        bids = getattr(event, "bids", []) or []
+        prices = [getattr(lv, "price", 0) or 0 for lv in asks] + [getattr(lv, "price", 0) or 0 for lv in bids]
+        scale = min(max((_decimals(p) for p in prices), default=0), _MAX_SCALE)
+        factor = 10 ** scale
+        scaled = [int(Decimal(str(p)) * factor) for p in prices]
+        n_asks = len(asks)
+        self.scale = scale
+        self.ask_px = array("q", scaled[:n_asks])
+        self.ask_vol = array("q", (int(getattr(lv, "volume", 0) or 0) for lv in asks))
+        self.ask_num = array("q", (int(getattr(lv, "order_num", 0) or 0) for lv in asks))
+        self.bid_px = array("q", scaled[n_asks:])
+        self.bid_vol = array("q", (int(getattr(lv, "volume", 0) or 0) for lv in bids))
+        self.bid_num = array("q", (int(getattr(lv, "order_num", 0) or 0) for lv in bids))
+
+    def _price(self, scaled: int) -> Decimal:
+        return Decimal(scaled).scaleb(-self.scale)
+
+    def to_dict(self, symbol: str) -> dict:
+        """与 QuoteService.get_depth 相同的结构。"""
+        def _side(px, vol, num) -> list[dict]:
+            return [
+                {"price": str(self._price(p)), "volume": v, "order_num": n}
+                for p, v, n in zip(px, vol, num)
+            ]
+        return {
+            "symbol": symbol,
+            "asks":   _side(self.ask_px, self.ask_vol, self.ask_num),
+            "bids":   _side(self.bid_px, self.bid_vol, self.bid_num),
+        }
+
+    def metrics(self, levels: int = 5) -> dict:
+        """
+        盘口衍生指标：
+          spread     —— 卖一 - 买一
+          mid        —— (卖一 + 买一) / 2
+          microprice —— 以对侧一档挂量加权的中间价: (卖一*买一量 + 买一*卖一量) / (买一量 + 卖一量)
+          imbalance  —— 前 levels 档 (买量 - 卖量) / (买量 + 卖量)，取值 [-1, 1]
+        缺少任一侧时价格类指标为 null。
+        """
+        ask_depth = sum(self.ask_vol[:levels])
+        bid_depth = sum(self.bid_vol[:levels])
+        total = ask_depth + bid_depth
+        imbalance = Decimal(bid_depth - ask_depth) / total if total else Decimal(0)
+        result = {
+            "levels":     levels,
+            "spread":     None,
+            "mid":        None,
+            "microprice": None,
+            "imbalance":  str(imbalance.quantize(Decimal("0.0001"))),
+            "bid_depth":  bid_depth,
+            "ask_depth":  ask_depth,
+        }
+        if not self.ask_px or not self.bid_px:
+            return result
+        ask, bid = self.ask_px[0], self.bid_px[0]
+        ask_vol, bid_vol = self.ask_vol[0], self.bid_vol[0]
+        result["spread"] = str(self._price(ask - bid))
+        result["mid"] = str(self._price(ask + bid) / 2)
+        if ask_vol + bid_vol:
+            micro = Decimal(ask * bid_vol + bid * ask_vol) / (ask_vol + bid_vol)
+            result["microprice"] = str(micro.scaleb(-self.scale).quantize(Decimal(1).scaleb(-(self.scale + 4))))
+        else:
+            result["microprice"] = result["mid"]
+        return result
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# (kind, symbol, event) → 协程
+IngestHandler = Callable[[str, str, Any], Awaitable[None]]
+
+
+class PushIngest:
+    """
+    SDK 推送回调 → 事件循环 的桥接层。
+
+    回调可能在 SDK 内部线程触发：原始事件直接写入有界环形缓冲（deque 的 append/popleft 线程安全），
+    仅在分发协程空闲时通过 loop.call_soon_threadsafe 唤醒一次，不会每个事件都创建任务或回调句柄。
+    单一分发协程按批取出事件交给 handler；缓冲满时最旧的事件被覆盖并计入 overflow。
+    """
+
+    def __init__(self, handler: IngestHandler, capacity: int = 65536, batch_size: int = 512):
+        self._handler = handler
+        self._capacity = capacity
+        self._batch_size = batch_size
+        self._buffer: deque = deque(maxlen=capacity)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._scheduled = False
+        self._task: asyncio.Task | None = None
+        # 计数器
+        self.received = 0
+        self.dispatched = 0
+        self.overflow = 0
+        self.batches = 0
+        self.max_depth = 0
+        self._reported_overflow = 0
+
+    def start(self):
+        """在事件循环内调用，启动分发协程。"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def put(self, kind: str, symbol: str, event: Any):
+        """线程安全：写入一条原始推送事件。"""
+        buffer = self._buffer
+        if len(buffer) >= self._capacity:
+            self.overflow += 1
+        buffer.append((kind, symbol, event))
+        self.received += 1
+        if not self._scheduled and self._loop is not None:
+            self._scheduled = True
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        buffer = self._buffer
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            self._scheduled = False
+            while buffer:
+                depth = len(buffer)
+                if depth > self.max_depth:
+                    self.max_depth = depth
+                for _ in range(min(depth, self._batch_size)):
+                    kind, symbol, event = buffer.popleft()
+                    try:
+                        await self._handler(kind, symbol, event)
+                    except Exception as e:
+                        logger.warning(f"push dispatch ({kind} {symbol}) failed: {e}")
+                    self.dispatched += 1
+                self.batches += 1
+                if self.overflow != self._reported_overflow:
+                    logger.warning(
+                        f"Push ingest buffer full, dropped {self.overflow - self._reported_overflow} events "
+                        f"(capacity={self._capacity})"
+                    )
+                    self._reported_overflow = self.overflow
+                # 批与批之间让出事件循环
+                await asyncio.sleep(0)
+
+    def stats(self) -> dict:
+        return {
+            "capacity":   self._capacity,
+            "depth":      len(self._buffer),
+            "max_depth":  self.max_depth,
+            "received":   self.received,
+            "dispatched": self.dispatched,
+            "overflow":   self.overflow,
+            "batches":    self.batches,
+        }
@@ -1,8 +1,11 @@
 import asyncio
+import datetime
 import logging
 import os
+import time
 from decimal import Decimal
-from typing import Callable, Awaitable
+from types import SimpleNamespace
+from typing import Callable, Awaitable, Hashable
 
 from longport.openapi import (
     Config,
@@ -19,6 +22,20 @@ from longport.openapi import (
     Market,
 )
 
+from bar_aggregator import BarAggregator
+from adjustment import AdjustmentFactors, derive_events, price_decimals
+from candle_store import STORED_PERIODS, CandleStore, bar_date, day_start, market_timezone, market_today
+from conflation import CONFLATABLE_TYPES, Conflator
+from indicators import StreamingIndicators
+from market_calendar import MARKET_TIMEZONES, MarketCalendar, symbol_market
+from order_book import OrderBook
+from push_ingest import PushIngest
+from request_cache import RequestCache
+from resample import parse_period, resample
+from static_catalog import StaticCatalog
+from tick_buffer import TickBuffer
+from upstream_scheduler import BACKGROUND, UpstreamBusyError, UpstreamScheduler, background, set_background
+
 logger = logging.getLogger(__name__)
 
 # --------------------------------------------------------------------------- #
@@ -37,6 +54,13 @@ PERIOD_MAP: dict[str, Period] = {
 }
 
 
+# 复权方式：none 不复权 / forward 前复权 / backward 后复权
+ADJUST_MODES = ("none", "forward", "backward")
+
+# 分钟 K 线周期 → 每根的分钟数（用于估算一个交易日的根数）
+PERIOD_MINUTES: dict[str, int] = {"1min": 1, "5min": 5, "15min": 15, "30min": 30, "60min": 60}
+
+
 def _decimal_to_str(v) -> str:
     """将 Decimal / float / str 统一序列化为字符串，避免精度损失。"""
     if v is None:
@@ -44,6 +68,20 @@ def _decimal_to_str(v) -> str:
     return str(v)
 
 
+def _candlestick_to_dict(item) -> dict:
+    """把历史 K 线接口返回的单根 K 线转成可序列化字典。"""
+    timestamp = getattr(item, "timestamp", None)
+    return {
+        "timestamp": int(timestamp.timestamp()) if hasattr(timestamp, "timestamp") else (int(timestamp) if timestamp else 0),
+        "open":     _decimal_to_str(getattr(item, "open", 0)),
+        "close":    _decimal_to_str(getattr(item, "close", 0)),
+        "high":     _decimal_to_str(getattr(item, "high", 0)),
+        "low":      _decimal_to_str(getattr(item, "low", 0)),
+        "volume":   int(getattr(item, "volume", 0)),
+        "turnover": _decimal_to_str(getattr(item, "turnover", 0)),
+    }
+
+
 def _quote_to_dict(symbol: str, q) -> dict:
     """把 QuoteContext.quote() 返回的单条记录转成可序列化字典。"""
     prev_close = getattr(q, "prev_close", None) or getattr(q, "last_close", None)
@@ -100,6 +138,22 @@ def _push_quote_to_dict(event: PushQuote) -> dict:
     }
 
 
+def _merge_push_quote(symbol: str, snapshot: dict, event: PushQuote) -> dict:
+    """用最新 PushQuote 更新快照字典；prev_close / name 沿用快照，涨跌额与涨跌幅据此重算。"""
+    merged = SimpleNamespace(
+        symbol=snapshot["name"],
+        prev_close=Decimal(snapshot["prev_close"]),
+        last_done=getattr(event, "last_done", None),
+        open=getattr(event, "open", Decimal("0")),
+        high=getattr(event, "high", Decimal("0")),
+        low=getattr(event, "low", Decimal("0")),
+        volume=getattr(event, "volume", 0),
+        turnover=getattr(event, "turnover", Decimal("0")),
+        timestamp=getattr(event, "timestamp", None),
+    )
+    return _quote_to_dict(symbol, merged)
+
+
 def _push_candlestick_to_dict(event: PushCandlestick) -> dict:
     candle = getattr(event, "candlestick", None) or event
     timestamp = getattr(candle, "timestamp", None)
@@ -145,6 +199,12 @@ def _push_depth_to_dict(event: PushDepth) -> dict:
     return {"asks": asks, "bids": bids}
 
 
+def _key_by_symbol(requested: list[str], rows: list[dict]) -> dict[str, dict]:
+    """把上游按标的返回的记录映射回请求中的标的写法（上游代码大小写可能与请求不同）。"""
+    by_upper = {sym.upper(): sym for sym in requested}
+    return {by_upper.get(row["symbol"].upper(), row["symbol"]): row for row in rows}
+
+
 # --------------------------------------------------------------------------- #
 # QuoteService
 # --------------------------------------------------------------------------- #
@@ -154,96 +214,642 @@ PushCallback = Callable[[str, str, dict], Awaitable[None]]
 class QuoteService:
     """封装 LongPort AsyncQuoteContext，提供行情查询与实时推送。"""
 
-    def __init__(self, push_callback: PushCallback):
+    # 单次历史 K 线请求最多返回的根数（SDK 限制），按时间段查询时按此切分窗口
+    HISTORY_LIMIT = 1000
+    # 交易时段未知时按美股（390 分钟）估算，宁可窗口切得偏小
+    DEFAULT_SESSION_MINUTES = 390
+    # 每日刷新除权事件表时回看的天数：区间内至少要有一个已推导过的交易日，才能算出其后新除权的比例
+    FACTOR_OVERLAP_DAYS = 14
+    # 上游交易日接口只接受一个月以内、最近一年内的区间：按 CALENDAR_CHUNK_DAYS 天分段拉取，
+    # 覆盖过去 CALENDAR_PAST_DAYS 天到未来 CALENDAR_AHEAD_DAYS 天
+    CALENDAR_CHUNK_DAYS = 28
+    CALENDAR_PAST_DAYS = 360
+    CALENDAR_AHEAD_DAYS = 60
+
+    # 各上游接口结果的默认缓存时间（秒）；静态信息由 StaticCatalog 缓存，这里只合并并发请求
+    DEFAULT_CACHE_TTLS: dict[str, float] = {
+        "quote":    1.0,
+        "static":   0.0,
+        "indexes":  5.0,
+        "capital":  5.0,
+        "resample": 5.0,
+    }
+
+    def __init__(
+        self,
+        push_callback: PushCallback,
+        release_grace: float = 30.0,
+        ingest_capacity: int = 65536,
+        ingest_batch: int = 512,
+        conflate_interval: float = 0.0,
+        quote_cache_max_age: float = 10.0,
+        book_metric_levels: int = 5,
+        bar_periods: list[str] | None = None,
+        bar_history: int = 500,
+        tick_capacity: int = 50000,
+        ema_spans: list[int] | None = None,
+        volume_windows: list[int] | None = None,
+        cache_ttls: dict[str, float] | None = None,
+        cache_max_entries: int = 10000,
+        static_catalog_path: str = "",
+        static_catalog_max_age: float = 86400.0,
+        calendar_refresh_interval: float = 86400.0,
+        upstream_batch_size: int = 500,
+        upstream_concurrency: int = 4,
+        scheduler: UpstreamScheduler | None = None,
+        candle_store_dir: str = "",
+        candle_store_max_series: int = 256,
+    ):
         self._push_callback = push_callback
         self._ctx: AsyncQuoteContext | None = None
+        # 所有 self._ctx.* 调用经由调度器限速（与 TradeService 共用同一个实例）
+        self._upstream = scheduler or UpstreamScheduler()
+        # 本地历史 K 线库：已收盘的日 K / 分钟 K 只从上游拉取一次
+        self._candles = CandleStore(candle_store_dir, candle_store_max_series)
+        # symbol → 除权事件表：复权 K 线由不复权 K 线在本地换算
+        self._factors: dict[str, AdjustmentFactors] = {}
+        # 已向上游订阅的标的
         self._subscribed: set[str] = set()
+        # 订阅归属：symbol → 持有者集合（WebSocket 连接 / "rest"），引用计数即集合大小
+        self._owners: dict[str, set[Hashable]] = {}
+        # 引用计数归零后等待释放的标的 → 负责释放的任务
+        self._pending_release: dict[str, asyncio.Task] = {}
+        # 全部未结束的延迟退订任务（被重新订阅取消释放的任务也保留引用直到结束）
+        self._release_tasks: set[asyncio.Task] = set()
+        self._release_grace = release_grace
+        self._sub_lock = asyncio.Lock()
+        # SDK 推送 → 事件循环 的有界缓冲与分发
+        self._ingest = PushIngest(self._dispatch_push, ingest_capacity, ingest_batch)
+        # 可选：quote / depth 只保留最新值，按固定间隔刷出
+        self._conflator = Conflator(self._emit_push, conflate_interval) if conflate_interval > 0 else None
+        # 已订阅标的的最新行情：上游快照 + 之后收到的最新 PushQuote（读取时合并）
+        self._quote_snapshots: dict[str, dict] = {}
+        self._pushed_quotes: dict[str, PushQuote] = {}
+        self._quote_updated: dict[str, float] = {}
+        self._quote_cache_max_age = quote_cache_max_age
+        self._quote_cache_hits = 0
+        self._quote_cache_misses = 0
+        # 已订阅标的的本地盘口（由 PushDepth 维护）
+        self._books: dict[str, OrderBook] = {}
+        self._book_metric_levels = book_metric_levels
+        # 由逐笔成交推送聚合的日内 K 线；sweep 任务负责收盘无新成交的 K 线
+        self._bars = BarAggregator(bar_periods or ["1s", "1min", "5min", "15min"], bar_history)
+        self._bar_sweep_task: asyncio.Task | None = None
+        # 已订阅标的的逐笔成交环形缓冲
+        self._ticks: dict[str, TickBuffer] = {}
+        self._tick_capacity = tick_capacity
+        # 已订阅标的的流式指标（VWAP / 滚动成交量 / EMA）
+        self._indicators: dict[str, StreamingIndicators] = {}
+        self._ema_spans = ema_spans or [12, 26]
+        self._volume_windows = volume_windows or [60, 300]
+        # 上游请求缓存：按接口分别配置 TTL，并发的相同请求合并为一次上游调用
+        ttls = {**self.DEFAULT_CACHE_TTLS, **(cache_ttls or {})}
+        self._caches = {name: RequestCache(ttl, cache_max_entries) for name, ttl in ttls.items()}
+        # 静态信息目录（JSON 快照持久化），每日刷新过期条目
+        self._catalog = StaticCatalog(static_catalog_path, static_catalog_max_age)
+        self._catalog_refresh_task: asyncio.Task | None = None
+        # 本地市场日历（交易时段 + 约一年的交易日），按固定间隔刷新
+        self._calendar = MarketCalendar()
+        self._calendar_refresh_interval = calendar_refresh_interval
+        self._calendar_task: asyncio.Task | None = None
+        # 多标的上游请求按 upstream_batch_size 分片，最多 upstream_concurrency 个分片同时在途
+        self._batch_size = max(upstream_batch_size, 1)
+        self._upstream_concurrency = max(upstream_concurrency, 1)
+        self._upstream_slots = asyncio.Semaphore(self._upstream_concurrency)
+        # 长区间 K 线的分窗口拉取单独占用一组并发槽位：等待 history 令牌的后台窗口不占住交互分片的槽位
+        self._history_slots = asyncio.Semaphore(self._upstream_concurrency)
+        self._chunks_sent = 0
+        self._chunks_failed = 0
 
     async def start(self):
         """初始化 LongPort 连接。Config 从环境变量读取（config.py 已在 main.py 中提前注入）。"""
         config = Config.from_env()
+        self._ingest.start()
+        if self._conflator is not None:
+            self._conflator.start()
+        self._bar_sweep_task = asyncio.create_task(self._sweep_bars())
+        self._catalog.load()
         self._ctx = await AsyncQuoteContext.create(config)
+        self._catalog_refresh_task = asyncio.create_task(self._refresh_catalog_periodically())
+        self._calendar_task = asyncio.create_task(self._refresh_calendar_periodically())
         self._ctx.set_on_quote(self._on_quote)
         self._ctx.set_on_candlestick(self._on_candlestick)
         self._ctx.set_on_trades(self._on_trades)
         self._ctx.set_on_depth(self._on_depth)
         logger.info("LongPort QuoteContext initialized (quote/candlestick/trades/depth).")
 
+    async def stop(self):
+        """停止推送分发，取消待执行的延迟退订。"""
+        await self._ingest.stop()
+        if self._conflator is not None:
+            await self._conflator.stop()
+        if self._bar_sweep_task is not None:
+            self._bar_sweep_task.cancel()
+            try:
+                await self._bar_sweep_task
+            except asyncio.CancelledError:
+                pass
+            self._bar_sweep_task = None
+        if self._catalog_refresh_task is not None:
+            self._catalog_refresh_task.cancel()
+            try:
+                await self._catalog_refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._catalog_refresh_task = None
+        if self._calendar_task is not None:
+            self._calendar_task.cancel()
+            try:
+                await self._calendar_task
+            except asyncio.CancelledError:
+                pass
+            self._calendar_task = None
+        for task in list(self._release_tasks):
+            task.cancel()
+        self._pending_release.clear()
+
     # ------------------------------------------------------------------ #
-    # 推送回调（由 SDK 内部线程调用，用 asyncio.create_task 转入事件循环）
+    # 推送回调（可能由 SDK 内部线程调用）：只把原始事件写入 ingest 缓冲，
+    # 序列化与下发由事件循环中的分发协程完成
     # ------------------------------------------------------------------ #
     def _on_quote(self, symbol: str, event: PushQuote):
-        data = _push_quote_to_dict(event)
-        asyncio.create_task(self._push_callback("quote", symbol, data))
+        self._ingest.put("quote", symbol, event)
 
     def _on_candlestick(self, symbol: str, event: PushCandlestick):
-        data = _push_candlestick_to_dict(event)
-        asyncio.create_task(self._push_callback("candlestick", symbol, data))
+        self._ingest.put("candlestick", symbol, event)
 
     def _on_trades(self, symbol: str, event: PushTrades):
-        data = _push_trades_to_dict(event)
-        asyncio.create_task(self._push_callback("trades", symbol, data))
+        self._ingest.put("trades", symbol, event)
 
     def _on_depth(self, symbol: str, event: PushDepth):
-        data = _push_depth_to_dict(event)
-        asyncio.create_task(self._push_callback("depth", symbol, data))
+        self._ingest.put("depth", symbol, event)
+
+    _PUSH_SERIALIZERS = {
+        "quote":       _push_quote_to_dict,
+        "candlestick": _push_candlestick_to_dict,
+        "trades":      _push_trades_to_dict,
+        "depth":       _push_depth_to_dict,
+    }
+
+    async def _dispatch_push(self, kind: str, symbol: str, event):
+        if kind == "quote":
+            # 最新值缓存：只记录原始事件，读取时再与快照合并
+            self._pushed_quotes[symbol] = event
+            self._quote_updated[symbol] = time.monotonic()
+        elif kind == "depth":
+            book = self._books.get(symbol)
+            if book is None:
+                book = self._books[symbol] = OrderBook()
+            book.update(event)
+        if self._conflator is not None and kind in CONFLATABLE_TYPES:
+            # 合并期间被覆盖的事件不会被序列化
+            self._conflator.offer(kind, symbol, event)
+            return
+        await self._emit_push(kind, symbol, event)
+
+    async def _emit_push(self, kind: str, symbol: str, event):
+        data = self._PUSH_SERIALIZERS[kind](event)
+        await self._push_callback(kind, symbol, data)
+        if kind == "depth":
+            book = self._books.get(symbol)
+            if book is not None:
+                await self._push_callback("book_metrics", symbol, book.metrics(self._book_metric_levels))
+        elif kind == "trades":
+            await self._record_trades(symbol, event)
+
+    async def _record_trades(self, symbol: str, event: PushTrades):
+        """逐笔成交写入环形缓冲、更新流式指标，并聚合为日内 K 线推送。"""
+        buf = self._ticks.get(symbol)
+        if buf is None:
+            buf = self._ticks[symbol] = TickBuffer(self._tick_capacity)
+        ind = self._indicators.get(symbol)
+        if ind is None:
+            ind = self._indicators[symbol] = StreamingIndicators(
+                self._ema_spans, self._volume_windows, market_timezone(symbol)
+            )
+        trades = []
+        for t in (getattr(event, "trades", []) or []):
+            ts = getattr(t, "timestamp", None)
+            ts = int(ts.timestamp()) if hasattr(ts, "timestamp") else (int(ts) if ts else 0)
+            price = Decimal(str(getattr(t, "price", 0) or 0))
+            volume = int(getattr(t, "volume", 0) or 0)
+            direction = getattr(t, "direction", None)
+            buf.append(
+                ts, price, volume,
+                str(direction).split(".")[-1] if direction else "",
+                str(getattr(t, "trade_type", "")),
+                str(getattr(t, "trade_session", "")).split(".")[-1],
+            )
+            ind.update(ts, price, volume)
+            trades.append((ts, price, volume))
+        if not trades:
+            return
+        await self._push_callback("indicators", symbol, ind.snapshot(time.time()))
+        for bar in self._bars.on_trades(symbol, trades):
+            await self._push_callback("bar", symbol, bar)
+
+    async def _sweep_bars(self):
+        """每秒收盘一次周期已结束、但之后没有新成交的 K 线。"""
+        while True:
+            await asyncio.sleep(1.0)
+            for symbol, bar in self._bars.sweep(time.time()):
+                try:
+                    await self._push_callback("bar", symbol, bar)
+                except Exception as e:
+                    logger.warning(f"bar push ({symbol}) failed: {e}")
+
+    @property
+    def ingest_stats(self) -> dict:
+        return self._ingest.stats()
+
+    @property
+    def conflation_stats(self) -> dict | None:
+        return self._conflator.stats() if self._conflator is not None else None
 
     # ------------------------------------------------------------------ #
     # 公开接口
     # ------------------------------------------------------------------ #
-    async def subscribe(self, symbols: list[str]):
-        new = [s for s in symbols if s not in self._subscribed]
-        if new:
-            # 订阅实时报价 + 逐笔成交 + 盘口深度
-            await self._ctx.subscribe(new, [SubType.Quote, SubType.Trade, SubType.Depth])
-            # 逐只订阅日K线推送
-            for sym in new:
-                try:
-                    await self._ctx.subscribe_candlesticks(sym, Period.Day)
-                except Exception as e:
-                    logger.warning(f"subscribe_candlesticks({sym}) failed: {e}")
-            self._subscribed.update(new)
-            logger.info(f"Subscribed: {new}")
+    async def subscribe(self, symbols: list[str], owner: Hashable = "rest"):
+        """
+        为 owner 订阅 symbols；仅对尚未订阅的标的发起上游订阅。
+        上游订阅成功后才记录 owner：订阅失败时不留下引用，之后的订阅会重新向上游发起。
+        """
+        async with self._sub_lock:
+            new = [s for s in dict.fromkeys(symbols) if s not in self._subscribed]
+            if new:
+                # 订阅实时报价 + 逐笔成交 + 盘口深度
+                await self._upstream.call("subscribe", self._ctx.subscribe, new, [SubType.Quote, SubType.Trade, SubType.Depth])
+                # 逐只订阅日K线推送
+                for sym in new:
+                    try:
+                        await self._upstream.call("subscribe", self._ctx.subscribe_candlesticks, sym, Period.Day)
+                    except Exception as e:
+                        logger.warning(f"subscribe_candlesticks({sym}) failed: {e}")
+                self._subscribed.update(new)
+                logger.info(f"Subscribed: {new}")
+            for sym in symbols:
+                self._owners.setdefault(sym, set()).add(owner)
+                # 宽限期内被重新订阅，取消待释放
+                self._pending_release.pop(sym, None)
+
+    async def unsubscribe(self, symbols: list[str], owner: Hashable = "rest"):
+        """
+        取消 owner 对 symbols 的订阅。
+        引用计数归零的标的在宽限期（release_grace 秒）后才向上游退订，
+        期间任意持有者重新订阅即取消释放。
+        """
+        async with self._sub_lock:
+            orphaned = []
+            for sym in symbols:
+                holders = self._owners.get(sym)
+                if holders is None:
+                    continue
+                holders.discard(owner)
+                if not holders:
+                    del self._owners[sym]
+                    if sym in self._subscribed:
+                        orphaned.append(sym)
+            if not orphaned:
+                return
+            if self._release_grace <= 0:
+                await self._upstream_unsubscribe(orphaned)
+                return
+            task = asyncio.create_task(self._release_later(orphaned))
+            self._release_tasks.add(task)
+            task.add_done_callback(self._release_done)
+            for sym in orphaned:
+                self._pending_release[sym] = task
+
+    async def release_owner(self, owner: Hashable):
+        """释放 owner 持有的全部订阅（WebSocket 断开时调用）。"""
+        owned = [sym for sym, holders in self._owners.items() if owner in holders]
+        if owned:
+            await self.unsubscribe(owned, owner)
+
+    def _release_done(self, task: asyncio.Task):
+        self._release_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"delayed unsubscribe failed: {task.exception()}")
 
-    async def unsubscribe(self, symbols: list[str]):
+    async def _release_later(self, symbols: list[str]):
+        await asyncio.sleep(self._release_grace)
+        async with self._sub_lock:
+            task = asyncio.current_task()
+            expired = [
+                sym for sym in symbols
+                if self._pending_release.get(sym) is task and sym not in self._owners
+            ]
+            for sym in expired:
+                del self._pending_release[sym]
+            if expired:
+                await self._upstream_unsubscribe(expired)
+
+    async def _upstream_unsubscribe(self, symbols: list[str]):
+        """向上游退订（调用方需持有 _sub_lock）。"""
         existing = [s for s in symbols if s in self._subscribed]
         if existing:
-            await self._ctx.unsubscribe(existing, [SubType.Quote, SubType.Trade, SubType.Depth])
+            await self._upstream.call("subscribe", self._ctx.unsubscribe, existing, [SubType.Quote, SubType.Trade, SubType.Depth])
             for sym in existing:
                 try:
-                    await self._ctx.unsubscribe_candlesticks(sym, Period.Day)
+                    await self._upstream.call("subscribe", self._ctx.unsubscribe_candlesticks, sym, Period.Day)
                 except Exception as e:
                     logger.warning(f"unsubscribe_candlesticks({sym}) failed: {e}")
             self._subscribed.difference_update(existing)
+            for sym in existing:
+                self._quote_snapshots.pop(sym, None)
+                self._quote_updated.pop(sym, None)
+                self._pushed_quotes.pop(sym, None)
+                self._books.pop(sym, None)
+                self._bars.drop(sym)
+                self._ticks.pop(sym, None)
+                self._indicators.pop(sym, None)
             logger.info(f"Unsubscribed: {existing}")
 
     async def get_quotes(self, symbols: list[str]) -> list[dict]:
-        items = await self._ctx.quote(symbols)
-        result = []
-        for i, item in enumerate(items):
-            sym = symbols[i] if i < len(symbols) else getattr(item, "symbol", "")
-            result.append(_quote_to_dict(sym, item))
-        return result
+        """
+        行情快照。已订阅且缓存新鲜的标的直接由推送维护的最新值返回，
+        其余标的（未订阅 / 尚无快照 / 超过 quote_cache_max_age 未更新）走上游。
+        """
+        now = time.monotonic()
+        cached: dict[str, dict] = {}
+        missing: list[str] = []
+        for sym in symbols:
+            quote = self._cached_quote(sym, now)
+            if quote is None:
+                missing.append(sym)
+            else:
+                cached[sym] = quote
+        self._quote_cache_hits += len(cached)
+        self._quote_cache_misses += len(missing)
+        if not missing:
+            return [cached[sym] for sym in symbols]
 
-    async def get_candlesticks(self, symbol: str, period_str: str = "day", count: int = 90) -> list[dict]:
-        period = PERIOD_MAP.get(period_str, Period.Day)
-        items = await self._ctx.history_candlesticks_by_offset(
-            symbol, period, AdjustType.NoAdjust, False, count
+        fetched_map = await self._caches["quote"].get_many(
+            missing, lambda batch: self._fetch_chunked(batch, self._fetch_quotes)
         )
-        result = []
+        return [cached.get(sym) or fetched_map[sym] for sym in symbols if sym in cached or sym in fetched_map]
+
+    async def _fetch_quotes(self, symbols: list[str]) -> dict[str, dict]:
+        items = await self._upstream.call("quote", self._ctx.quote, symbols)
+        now = time.monotonic()
+        # 按上游返回的标的代码对应回请求的写法，不依赖返回顺序
+        by_upper = {sym.upper(): sym for sym in symbols}
+        result = {}
         for item in items:
-            timestamp = getattr(item, "timestamp", None)
-            result.append({
-                "timestamp": int(timestamp.timestamp()) if hasattr(timestamp, "timestamp") else (int(timestamp) if timestamp else 0),
-                "open":     _decimal_to_str(getattr(item, "open", 0)),
-                "close":    _decimal_to_str(getattr(item, "close", 0)),
-                "high":     _decimal_to_str(getattr(item, "high", 0)),
-                "low":      _decimal_to_str(getattr(item, "low", 0)),
-                "volume":   int(getattr(item, "volume", 0)),
-                "turnover": _decimal_to_str(getattr(item, "turnover", 0)),
-            })
+            code = str(getattr(item, "symbol", "") or "")
+            sym = by_upper.get(code.upper())
+            if sym is None:
+                continue
+            quote = _quote_to_dict(sym, item)
+            result[sym] = quote
+            if sym in self._subscribed:
+                # 作为推送合并的基准快照（prev_close / name 等静态字段来自这里）
+                self._quote_snapshots[sym] = quote
+                self._quote_updated[sym] = now
+                self._pushed_quotes.pop(sym, None)
         return result
 
+    async def _fetch_chunked(
+        self,
+        symbols: list[str],
+        fetch: Callable[[list[str]], Awaitable[dict[str, dict]]],
+    ) -> dict[str, dict]:
+        """
+        把标的列表按 upstream_batch_size 分片并发请求上游（受 upstream_concurrency 限制），按 symbol 合并结果。
+        单个分片失败只记录日志，其标的不出现在结果中；全部分片失败时抛出第一个分片的异常。
+        """
+        chunks = [symbols[i:i + self._batch_size] for i in range(0, len(symbols), self._batch_size)]
+
+        async def _one(chunk: list[str]) -> dict[str, dict]:
+            async with self._upstream_slots:
+                self._chunks_sent += 1
+                return await fetch(chunk)
+
+        results = await asyncio.gather(*(_one(chunk) for chunk in chunks), return_exceptions=True)
+        merged: dict[str, dict] = {}
+        errors: list[BaseException] = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, BaseException):
+                self._chunks_failed += 1
+                errors.append(result)
+                logger.warning(
+                    f"upstream chunk of {len(chunk)} symbols ({chunk[0]} .. {chunk[-1]}) failed: {result!r}"
+                )
+            else:
+                merged.update(result)
+        if errors and len(errors) == len(chunks):
+            raise errors[0]
+        return merged
+
+    @property
+    def upstream_chunk_stats(self) -> dict:
+        """多标的上游请求的分片配置与已发送 / 失败的分片数。"""
+        return {
+            "batch_size":  self._batch_size,
+            "concurrency": self._upstream_concurrency,
+            "sent":        self._chunks_sent,
+            "failed":      self._chunks_failed,
+        }
+
+    def _cached_quote(self, symbol: str, now: float) -> dict | None:
+        """返回推送维护的最新行情；未订阅、无快照或过期时返回 None。"""
+        if symbol not in self._subscribed:
+            return None
+        snapshot = self._quote_snapshots.get(symbol)
+        if snapshot is None or now - self._quote_updated.get(symbol, 0.0) > self._quote_cache_max_age:
+            return None
+        event = self._pushed_quotes.pop(symbol, None)
+        if event is not None:
+            snapshot = self._quote_snapshots[symbol] = _merge_push_quote(symbol, snapshot, event)
+        return snapshot
+
+    @property
+    def request_cache_stats(self) -> dict[str, dict]:
+        """各上游接口缓存的命中 / 未命中 / 合并请求计数。"""
+        return {name: cache.stats() for name, cache in self._caches.items()}
+
+    @property
+    def quote_cache_stats(self) -> dict:
+        return {
+            "symbols": len(self._quote_snapshots),
+            "hits":    self._quote_cache_hits,
+            "misses":  self._quote_cache_misses,
+        }
+
+    async def get_candlesticks(self, symbol: str, period_str: str = "day", count: int = 90) -> list[dict]:
+        """
+        最近 count 根 K 线。日 K / 分钟 K 优先由本地 K 线库返回：补齐库中截至昨天的缺口，
+        再从上游取当天的 K 线；库中根数不够时按偏移量从上游拉取，并把已收盘的部分写入库中。
+        自定义周期（如 10min / 2h / 3day）由基础周期 K 线合成；无法识别的周期按日 K 返回。
+        """
+        custom = None if period_str in PERIOD_MAP else parse_period(period_str)
+        if custom is not None:
+            base, multiple = custom
+            return await self._caches["resample"].get(
+                ("last", symbol, period_str, count),
+                lambda: self._resampled_last(symbol, base, multiple, count),
+            )
+        period_str = period_str if period_str in PERIOD_MAP else "day"
+        if period_str not in STORED_PERIODS:
+            return await self._fetch_candles_by_offset(symbol, period_str, count)
+
+        today = market_today(symbol)
+        yesterday = today - datetime.timedelta(days=1)
+        async with self._candles.lock(symbol, period_str):
+            series = await self._candles.series(symbol, period_str)
+            if series.begin is not None:
+                if await self._fill_candle_gaps(symbol, series, series.begin, yesterday):
+                    await self._candles.save(symbol, period_str, series)
+                todays = await self._fetch_candles_by_date(symbol, period_str, AdjustType.NoAdjust, today, today)
+                if len(series) + len(todays) >= count:
+                    rows = series.last(max(count - len(todays), 0)) + todays
+                    self._candles.local_bars += len(rows) - len(todays)
+                    return rows[-count:]
+
+            rows = await self._fetch_candles_by_offset(symbol, period_str, count)
+            closed = [r for r in rows if series.bar_date(r["timestamp"]) < today]
+            if closed:
+                begin = series.bar_date(closed[0]["timestamp"])
+                if period_str != "day":
+                    # 第一天的分钟 K 可能只取到一部分，不计入覆盖区间
+                    begin += datetime.timedelta(days=1)
+                if begin <= yesterday:
+                    series.merge([r for r in closed if series.bar_date(r["timestamp"]) >= begin], begin, yesterday)
+                    await self._candles.save(symbol, period_str, series)
+            return rows
+
+    async def _resampled_last(self, symbol: str, base: str, multiple: int, count: int) -> list[dict]:
+        # 多取一根的量：最早的一根可能只取到部分基础 K 线
+        rows = await self.get_candlesticks(symbol, base, (count + 1) * multiple)
+        return self._resample(symbol, base, multiple, rows)[-count:]
+
+    def _resample(self, symbol: str, base: str, multiple: int, rows: list[dict]) -> list[dict]:
+        return resample(
+            rows, base, multiple, self._session_bounds(symbol, base, rows),
+            market_timezone(symbol), weekdays_only=symbol_market(symbol) is not None,
+        )
+
+    def _session_bounds(self, symbol: str, base: str, rows: list[dict]) -> list[tuple[int, int]]:
+        """rows 所跨各交易日（含前一天，覆盖隔夜时段）的交易时段，供分钟 K 合成按时段对齐。"""
+        market = symbol_market(symbol)
+        if base == "day" or market is None or not rows:
+            return []
+        tz = MARKET_TIMEZONES[market]
+        day = datetime.datetime.fromtimestamp(rows[0]["timestamp"], tz).date() - datetime.timedelta(days=1)
+        last = datetime.datetime.fromtimestamp(rows[-1]["timestamp"], tz).date()
+        bounds = []
+        while day <= last:
+            bounds.extend(self._calendar.session_bounds(market, day))
+            day += datetime.timedelta(days=1)
+        return sorted(bounds)
+
+    async def _fetch_candles_by_offset(self, symbol: str, period_str: str, count: int) -> list[dict]:
+        items = await self._upstream.call(
+            "history", self._ctx.history_candlesticks_by_offset,
+            symbol, PERIOD_MAP[period_str], AdjustType.NoAdjust, False, count
+        )
+        return [_candlestick_to_dict(item) for item in items]
+
+    async def _fetch_candles_by_date(self, symbol: str, period_str: str, adj, start, end) -> list[dict]:
+        """
+        按日期区间从上游拉取 K 线。区间较长时按交易日历切成每段不超过 HISTORY_LIMIT 根的窗口，
+        在 upstream_concurrency 限制下并发拉取，按时间戳去重后按时间顺序拼接。
+        多窗口拉取使用独立的并发槽位（不占用行情 / 静态信息等分片的槽位），按 background 优先级调度：
+        不挤占其他交互请求的 history 令牌，排队上限取后台的 queue timeout；
+        按 history 限速估算的总耗时超过该上限时直接抛出 UpstreamBusyError。
+        """
+        if start is None:
+            return await self._fetch_candle_window(symbol, period_str, adj, start, end)
+        windows = self._candle_windows(symbol, period_str, start, end or market_today(symbol))
+        if len(windows) == 1:
+            return await self._fetch_candle_window(symbol, period_str, adj, start, end)
+
+        wait = self._upstream.estimate_wait("history", len(windows))
+        limit = self._upstream.queue_timeout(BACKGROUND)
+        if wait > limit:
+            raise UpstreamBusyError(
+                f"{symbol} {period_str} {start}..{end} needs {len(windows)} history calls "
+                f"(~{wait:.0f}s at the current rate limit, over {limit:.0f}s)"
+            )
+
+        async def _one(lo: datetime.date, hi: datetime.date) -> list[dict]:
+            async with self._history_slots:
+                with background():
+                    return await self._fetch_candle_window(symbol, period_str, adj, lo, hi)
+
+        parts = await asyncio.gather(*(_one(lo, hi) for lo, hi in windows))
+        merged = {row["timestamp"]: row for part in parts for row in part}
+        return [merged[ts] for ts in sorted(merged)]
+
+    async def _fetch_candle_window(self, symbol: str, period_str: str, adj, start, end) -> list[dict]:
+        # 官方示例：ctx.history_candlesticks_by_date("700.HK", Period.Day, AdjustType.NoAdjust, date(2023,1,1), date(2023,2,1))
+        items = await self._upstream.call(
+            "history", self._ctx.history_candlesticks_by_date,
+            symbol, PERIOD_MAP[period_str], adj, start, end
+        )
+        rows = [_candlestick_to_dict(item) for item in items]
+        if len(rows) >= self.HISTORY_LIMIT and start is not None and end is not None and start < end:
+            # 返回条数达到上限，结果可能被截断：对半拆分后重取
+            mid = start + datetime.timedelta(days=(end - start).days // 2)
+            head, tail = await asyncio.gather(
+                self._fetch_candle_window(symbol, period_str, adj, start, mid),
+                self._fetch_candle_window(symbol, period_str, adj, mid + datetime.timedelta(days=1), end),
+            )
+            merged = {row["timestamp"]: row for row in rows + head + tail}
+            rows = [merged[ts] for ts in sorted(merged)]
+        return rows
+
+    def _candle_windows(
+        self, symbol: str, period_str: str, start: datetime.date, end: datetime.date,
+    ) -> list[tuple[datetime.date, datetime.date]]:
+        """
+        把 [start, end] 切成首尾相接的日期窗口，每个窗口预计不超过 HISTORY_LIMIT 的 90%。
+        交易日取自本地市场日历（未覆盖时按周一至周五估计），每日根数按该市场正常交易时段的分钟数估算。
+        周 / 月 / 年 K 根数很少，不切分。
+        """
+        if period_str == "day":
+            per_day = 1
+        elif period_str in PERIOD_MINUTES:
+            market = symbol_market(symbol)
+            minutes = (self._calendar.regular_minutes(market) if market else None) or self.DEFAULT_SESSION_MINUTES
+            per_day = minutes // PERIOD_MINUTES[period_str] + 1
+        else:
+            return [(start, end)]
+
+        market = symbol_market(symbol)
+        known = self._calendar.trading_days(market, start, end) if market else None
+        if known is not None:
+            days = sorted(known[0] + known[1])
+        else:
+            days = [
+                start + datetime.timedelta(days=i) for i in range((end - start).days + 1)
+                if (start + datetime.timedelta(days=i)).weekday() < 5
+            ]
+
+        budget = self.HISTORY_LIMIT * 9 // 10
+        windows = []
+        lo, bars = start, 0
+        for day in days:
+            if bars and bars + per_day > budget:
+                windows.append((lo, day - datetime.timedelta(days=1)))
+                lo, bars = day, 0
+            bars += per_day
+        windows.append((lo, end))
+        return windows
+
+    async def _fill_candle_gaps(self, symbol: str, series, begin: datetime.date, end: datetime.date) -> bool:
+        """从上游补齐 series 覆盖 [begin, end] 所缺的头 / 尾区间（调用方需持有该序列的锁）；返回是否有补齐。"""
+        gaps = series.gaps(begin, end)
+        if not gaps:
+            return False
+        fetched = await asyncio.gather(*(
+            self._fetch_candles_by_date(symbol, series.period, AdjustType.NoAdjust, lo, hi) for lo, hi in gaps
+        ))
+        self._candles.gap_fetches += len(gaps)
+        for (lo, hi), rows in zip(gaps, fetched):
+            series.merge(rows, lo, hi)
+        return True
+
     async def get_candlesticks_by_date(
         self,
         symbol: str,
@@ -257,64 +863,183 @@ class QuoteService:
         官方签名（位置参数）:
           history_candlesticks_by_date(symbol, period, adjust_type, start, end)
         start / end: datetime.date 或 datetime.datetime（取 date 部分传给 SDK）
+
+        日 K / 分钟 K 由本地 K 线库返回已收盘的部分，只向上游补齐库中缺少的头部 / 尾部区间；
+        当天（尚未收盘）的 K 线总是从上游取。复权（forward 前复权 / backward 后复权）由本地除权事件表
+        换算不复权 K 线得到；周 / 月 / 年 K 或未指定 start 时前复权取自上游，后复权由前复权换算。
+        自定义周期（如 10min / 2h / 3day）由基础周期 K 线合成。
         """
-        import datetime as _dt
-        period = PERIOD_MAP.get(period_str, Period.Day)
-        adjust_map = {
-            "none":    AdjustType.NoAdjust,
-            "forward": AdjustType.ForwardAdjust,
-        }
-        adj = adjust_map.get((adjust or "none").lower(), AdjustType.NoAdjust)
+        custom = None if period_str in PERIOD_MAP else parse_period(period_str)
+        if custom is not None:
+            base, multiple = custom
+            return await self._caches["resample"].get(
+                ("range", symbol, period_str, start, end, adjust),
+                lambda: self._resampled_range(symbol, base, multiple, start, end, adjust),
+            )
+        period_str = period_str if period_str in PERIOD_MAP else "day"
+        mode = (adjust or "none").lower()
+        mode = mode if mode in ADJUST_MODES else "none"
 
         def _to_date(v):
             if v is None:
                 return None
-            if isinstance(v, _dt.datetime):
+            if isinstance(v, datetime.datetime):
                 return v.date()
-            if isinstance(v, _dt.date):
+            if isinstance(v, datetime.date):
                 return v
             return None
 
-        # 官方示例：ctx.history_candlesticks_by_date("700.HK", Period.Day, AdjustType.NoAdjust, date(2023,1,1), date(2023,2,1))
-        items = await self._ctx.history_candlesticks_by_date(
-            symbol, period, adj, _to_date(start), _to_date(end)
-        )
+        start, end = _to_date(start), _to_date(end)
+        tz = market_timezone(symbol)
+        if period_str in STORED_PERIODS and start is not None:
+            rows = await self._stored_candles_by_date(symbol, period_str, start, end)
+            if mode == "none" or not rows:
+                return rows
+            factors = await self._adjustment_factors(symbol)
+            return factors.adjust(rows, mode, lambda day: day_start(day, period_str, tz))
 
-        result = []
-        for item in items:
-            timestamp = getattr(item, "timestamp", None)
-            ts_int = int(timestamp.timestamp()) if hasattr(timestamp, "timestamp") else (int(timestamp) if timestamp else 0)
-            result.append({
-                "timestamp": ts_int,
-                "open":     _decimal_to_str(getattr(item, "open", 0)),
-                "close":    _decimal_to_str(getattr(item, "close", 0)),
-                "high":     _decimal_to_str(getattr(item, "high", 0)),
-                "low":      _decimal_to_str(getattr(item, "low", 0)),
-                "volume":   int(getattr(item, "volume", 0)),
-                "turnover": _decimal_to_str(getattr(item, "turnover", 0)),
-            })
+        if mode == "none":
+            return await self._fetch_candles_by_date(symbol, period_str, AdjustType.NoAdjust, start, end)
+        rows = await self._fetch_candles_by_date(symbol, period_str, AdjustType.ForwardAdjust, start, end)
+        if mode == "forward" or not rows:
+            return rows
+        factors = await self._adjustment_factors(symbol)
+        return factors.backward_from_forward(rows)
+
+    async def _stored_candles_by_date(
+        self, symbol: str, period_str: str, start: datetime.date, end: datetime.date | None,
+    ) -> list[dict]:
+        """不复权日 K / 分钟 K：已收盘的部分由本地 K 线库返回（先补齐缺口），当天的 K 线从上游取。"""
+        today = market_today(symbol)
+        end = end or today
+        if start > end:
+            return []
+        closed_end = min(end, today - datetime.timedelta(days=1))
+        result: list[dict] = []
+        if start <= closed_end:
+            async with self._candles.lock(symbol, period_str):
+                series = await self._candles.series(symbol, period_str)
+                if await self._fill_candle_gaps(symbol, series, start, closed_end):
+                    await self._candles.save(symbol, period_str, series)
+                result = series.between(start, closed_end)
+                self._candles.local_bars += len(result)
+        if end >= today:
+            result += await self._fetch_candles_by_date(symbol, period_str, AdjustType.NoAdjust, max(start, today), end)
         return result
 
-    async def get_trades(self, symbol: str, count: int = 100) -> list[dict]:
-        """逐笔成交：最近 count 笔成交记录。"""
-        items = await self._ctx.trades(symbol, count)
+    async def _adjustment_factors(self, symbol: str) -> AdjustmentFactors:
+        """
+        symbol 的除权事件表，保证覆盖 [最早可取到的日期, 今天] 且今天推导过。首次使用时从最早可取到的日期
+        推导到今天（后复权的基准因此固定，不随请求过的区间变化）；之后每天首次使用时从上次推导的末尾
+        回看 FACTOR_OVERLAP_DAYS 天到今天。需要推导的区间各拉取一次前复权日 K，与本地库中的不复权日 K
+        比较得出除权事件。
+        """
+        async with self._candles.lock(symbol, "factors"):
+            today = market_today(symbol)
+            factors = self._factors.get(symbol)
+            if factors is None:
+                data = await self._candles.load_factors(symbol)
+                try:
+                    factors = AdjustmentFactors.from_dict(data) if data else None
+                except (KeyError, TypeError, ValueError, ArithmeticError) as e:
+                    logger.warning(f"adjustment factors of {symbol} unreadable, deriving again: {e}")
+            if factors is None:
+                begin = await self._first_available_date(symbol)
+                spans = [(begin, today)]
+                factors = AdjustmentFactors(begin, begin, today, [])
+            elif factors.derived_on != today or factors.end < today:
+                overlap = datetime.timedelta(days=self.FACTOR_OVERLAP_DAYS)
+                spans = [(max(factors.end - overlap, factors.begin), today)]
+            else:
+                return factors
+
+            tz = market_timezone(symbol)
+            for lo, hi in spans:
+                raw, adjusted = await asyncio.gather(
+                    self._stored_candles_by_date(symbol, "day", lo, hi),
+                    self._fetch_candles_by_date(symbol, "day", AdjustType.ForwardAdjust, lo, hi),
+                )
+                self._candles.factor_fetches += 1
+                events = derive_events(raw, adjusted, lambda ts: bar_date(ts, "day", tz))
+                first = bar_date(adjusted[0]["timestamp"], "day", tz) if adjusted else hi
+                factors = factors.merged(events, lo, hi, first, today, price_decimals(adjusted))
+            self._factors[symbol] = factors
+            await self._candles.save_factors(symbol, factors.to_dict())
+            return factors
+
+    async def _first_available_date(self, symbol: str) -> datetime.date:
+        """上游最早可取到的日期（约为上市日期）：全部月 K 中第一根所在月份的 1 日；取不到时为今天。"""
+        months = await self._fetch_candle_window(symbol, "month", AdjustType.NoAdjust, None, None)
+        if not months:
+            return market_today(symbol)
+        first = min(r["timestamp"] for r in months)
+        return bar_date(first, "day", market_timezone(symbol)).replace(day=1)
+
+    async def _resampled_range(self, symbol: str, base: str, multiple: int, start, end, adjust: str) -> list[dict]:
+        rows = await self.get_candlesticks_by_date(symbol, base, start, end, adjust)
+        return self._resample(symbol, base, multiple, rows)
+
+    @property
+    def candle_store_stats(self) -> dict:
+        return self._candles.stats()
+
+    async def get_trades(
+        self,
+        symbol: str,
+        count: int = 100,
+        start: int | None = None,
+        end: int | None = None,
+        direction: str | None = None,
+        before: int | None = None,
+    ) -> list[dict]:
+        """
+        逐笔成交：[start, end]（Unix 秒）范围内、方向为 direction 的最近 count 笔成交，按时间从早到晚。
+        已订阅标的在本地缓冲能完整回答时直接返回（附带 seq，可作为 before 翻页游标），
+        否则回源上游最近 1000 笔后再过滤。
+        """
+        buf = self._ticks.get(symbol) if symbol in self._subscribed else None
+        if buf is not None and len(buf):
+            rows = buf.query(count, start, end, direction, before)
+            covered = start is not None and start >= buf.oldest_timestamp
+            if before is not None or covered or len(rows) >= count:
+                return rows
+
+        # 有过滤条件时取上游允许的最大笔数再筛选
+        filtered = start is not None or end is not None or bool(direction)
+        items = await self._upstream.call("quote", self._ctx.trades, symbol, 1000 if filtered else min(count, 1000))
         result = []
         for item in items:
             ts = getattr(item, "timestamp", None)
-            direction = getattr(item, "direction", None)
+            side = getattr(item, "direction", None)
             result.append({
                 "price":         _decimal_to_str(getattr(item, "price", 0)),
                 "volume":        int(getattr(item, "volume", 0)),
                 "timestamp":     int(ts.timestamp()) if hasattr(ts, "timestamp") else (int(ts) if ts else 0),
-                "direction":     str(direction).split(".")[-1] if direction else "",  # "Up" / "Down" / "Neutral"
+                "direction":     str(side).split(".")[-1] if side else "",  # "Up" / "Down" / "Neutral"
                 "trade_type":    str(getattr(item, "trade_type", "")),
                 "trade_session": str(getattr(item, "trade_session", "")).split(".")[-1],
             })
-        return result
+        if filtered:
+            result = [
+                t for t in result
+                if (start is None or t["timestamp"] >= start)
+                and (end is None or t["timestamp"] <= end)
+                and (not direction or t["direction"] == direction)
+            ]
+        return result[-count:]
+
+    @property
+    def tick_capacity(self) -> int:
+        return self._tick_capacity
+
+    @property
+    def tick_stats(self) -> dict[str, dict]:
+        """每个标的成交缓冲的笔数、容量与占用字节数。"""
+        return {sym: buf.stats() for sym, buf in self._ticks.items()}
 
     async def get_intraday(self, symbol: str) -> list[dict]:
         """分时数据：当日每分钟的价格、均价、成交量、成交额。"""
-        items = await self._ctx.intraday(symbol)
+        items = await self._upstream.call("quote", self._ctx.intraday, symbol)
         result = []
         for item in items:
             ts = getattr(item, "timestamp", None)
@@ -328,7 +1053,11 @@ class QuoteService:
         return result
 
     async def get_depth(self, symbol: str) -> dict:
-        resp = await self._ctx.depth(symbol)
+        """盘口深度；已订阅标的直接返回推送维护的本地盘口。"""
+        book = self._books.get(symbol)
+        if book is not None and symbol in self._subscribed:
+            return book.to_dict(symbol)
+        resp = await self._upstream.call("quote", self._ctx.depth, symbol)
 
         def _level(lv) -> dict:
             return {
@@ -341,17 +1070,97 @@ class QuoteService:
         bids = [_level(lv) for lv in (getattr(resp, "bids", []) or [])]
         return {"symbol": symbol, "asks": asks, "bids": bids}
 
+    async def get_book_metrics(self, symbol: str, levels: int | None = None) -> dict:
+        """盘口衍生指标（价差 / 中间价 / 微价格 / 前 N 档失衡）；未订阅时基于一次上游 depth 计算。"""
+        levels = levels or self._book_metric_levels
+        book = self._books.get(symbol) if symbol in self._subscribed else None
+        if book is None:
+            book = OrderBook()
+            book.update(await self._upstream.call("quote", self._ctx.depth, symbol))
+        return {"symbol": symbol, **book.metrics(levels)}
+
+    def get_bars(self, symbol: str, period: str = "1min", count: int = 100) -> dict | None:
+        """由推送聚合的日内 K 线（最近 count 根已收盘 + 进行中）；未订阅的标的返回 None。"""
+        if symbol not in self._subscribed:
+            return None
+        return self._bars.bars(symbol, period, count)
+
+    def get_indicators(self, symbol: str) -> dict | None:
+        """流式指标快照；未订阅或订阅后尚无成交时返回 None。"""
+        ind = self._indicators.get(symbol) if symbol in self._subscribed else None
+        if ind is None:
+            return None
+        return {"symbol": symbol, **ind.snapshot(time.time())}
+
+    @property
+    def bar_periods(self) -> list[str]:
+        return self._bars.periods
+
+    @property
+    def bar_stats(self) -> dict:
+        return self._bars.stats()
+
     @property
     def subscribed_symbols(self) -> list[str]:
         return list(self._subscribed)
 
+    @property
+    def subscription_refs(self) -> dict[str, int]:
+        """每个标的当前的订阅引用计数。"""
+        return {sym: len(holders) for sym, holders in self._owners.items()}
+
     # ------------------------------------------------------------------ #
     # 基本面
     # ------------------------------------------------------------------ #
 
     async def get_static_info(self, symbols: list[str]) -> list[dict]:
-        """静态基本面：名称、交易所、流通股、EPS、BPS、股息率等。"""
-        items = await self._ctx.static_info(symbols)
+        """
+        静态基本面：名称、交易所、流通股、EPS、BPS、股息率等。
+        优先读本地目录；缺失或过期的标的分片并发请求上游补齐并写回目录，
+        上游（或其中某个分片）失败时对已有（过期）条目的标的返回旧值。
+        """
+        symbols = list(dict.fromkeys(symbols))
+        found, missing = self._catalog.lookup(symbols)
+        if missing:
+            try:
+                found.update(await self._caches["static"].get_many(
+                    missing, lambda batch: self._fetch_chunked(batch, self._fetch_static_info)
+                ))
+            except Exception as e:
+                if any(self._catalog.peek(sym) is None for sym in missing):
+                    raise
+                logger.warning(f"static_info refresh failed, serving catalog entries: {e}")
+            for sym in missing:
+                if sym not in found and (stale := self._catalog.peek(sym)) is not None:
+                    found[sym] = stale
+        return [found[sym] for sym in symbols if sym in found]
+
+    async def refresh_static_info(self, symbols: list[str] | None = None) -> int:
+        """从上游重新拉取 symbols（默认目录中的全部标的）的静态信息，返回更新的条目数。"""
+        symbols = list(dict.fromkeys(symbols)) if symbols else self._catalog.symbols
+        if not symbols:
+            return 0
+        return len(await self._fetch_chunked(symbols, self._fetch_static_info))
+
+    async def _refresh_catalog_periodically(self):
+        """每小时检查一次，刷新超过有效期的目录条目（即每个标的每天刷新一次）。"""
+        set_background()
+        while True:
+            stale = self._catalog.stale_symbols()
+            if stale:
+                try:
+                    count = await self.refresh_static_info(stale)
+                    logger.info(f"Static catalog refreshed: {count} symbols")
+                except Exception as e:
+                    logger.warning(f"static catalog refresh failed: {e}")
+            await asyncio.sleep(3600)
+
+    @property
+    def static_catalog_stats(self) -> dict:
+        return self._catalog.stats()
+
+    async def _fetch_static_info(self, symbols: list[str]) -> dict[str, dict]:
+        items = await self._upstream.call("quote", self._ctx.static_info, symbols)
         result = []
         for item in items:
             derivatives = [
@@ -374,7 +1183,9 @@ class QuoteService:
                 "dividend_yield":     _decimal_to_str(getattr(item, "dividend_yield", None)),
                 "stock_derivatives":  derivatives,
             })
-        return result
+        rows = _key_by_symbol(symbols, result)
+        await self._catalog.store(rows)
+        return rows
 
     async def get_calc_indexes(self, symbols: list[str]) -> list[dict]:
         """估值指标：PE、PB、股息率 TTM、各周期涨跌幅、总市值、换手率等。"""
@@ -389,7 +1200,14 @@ class QuoteService:
             CalcIndex.TenDayChangeRate,
             CalcIndex.HalfYearChangeRate,
         ]
-        items = await self._ctx.calc_indexes(symbols, indexes)
+        found = await self._caches["indexes"].get_many(
+            symbols,
+            lambda missing: self._fetch_chunked(missing, lambda chunk: self._fetch_calc_indexes(chunk, indexes)),
+        )
+        return [found[sym] for sym in dict.fromkeys(symbols) if sym in found]
+
+    async def _fetch_calc_indexes(self, symbols: list[str], indexes: list) -> dict[str, dict]:
+        items = await self._upstream.call("quote", self._ctx.calc_indexes, symbols, indexes)
         result = []
         for item in items:
             result.append({
@@ -404,11 +1222,14 @@ class QuoteService:
                 "ten_day_change_rate":      _decimal_to_str(getattr(item, "ten_day_change_rate", None)),
                 "half_year_change_rate":    _decimal_to_str(getattr(item, "half_year_change_rate", None)),
             })
-        return result
+        return _key_by_symbol(symbols, result)
 
     async def get_capital_distribution(self, symbol: str) -> dict:
         """资金分布：大单/中单/小单 流入/流出。"""
-        resp = await self._ctx.capital_distribution(symbol)
+        return await self._caches["capital"].get(symbol, lambda: self._fetch_capital_distribution(symbol))
+
+    async def _fetch_capital_distribution(self, symbol: str) -> dict:
+        resp = await self._upstream.call("quote", self._ctx.capital_distribution, symbol)
 
         def _side(obj) -> dict:
             return {
@@ -445,12 +1266,17 @@ class QuoteService:
           {
             "market": "HK",
             "trade_sessions": [
-              {"begin_time": "09:30", "end_time": "12:00", "trade_session": "NormalTrade"},
+              {"begin_time": "09:30", "end_time": "12:00", "trade_session": "Intraday"},
               ...
             ]
           }
         """
-        items = await self._ctx.trading_session()
+        if not self._calendar.has_sessions:
+            self._calendar.set_sessions(await self._fetch_trading_session())
+        return self._calendar.sessions()
+
+    async def _fetch_trading_session(self) -> list:
+        items = await self._upstream.call("quote", self._ctx.trading_session)
         result = []
         for item in items:
             market_val = getattr(item, "market", None)
@@ -481,8 +1307,26 @@ class QuoteService:
         返回指定市场、日期范围内的交易日和半日市信息。
         market: HK / US / CN / SG / Crypto
         """
-        import datetime as _dt
+        def _fmt(d) -> str:
+            return d.strftime("%Y-%m-%d") if hasattr(d, "strftime") else str(d)
+
         market_key = (market or "HK").upper()
+        cached = self._calendar.trading_days(market_key, begin, end)
+        if cached is not None:
+            trading, half = cached
+        else:
+            trading, half = await self._fetch_trading_days(market_key, begin, end)
+        return {
+            "market":             market_key,
+            "begin":              _fmt(begin),
+            "end":                _fmt(end),
+            "trading_days":       [_fmt(d) for d in trading],
+            "half_trading_days":  [_fmt(d) for d in half],
+        }
+
+    async def _fetch_trading_days(self, market_key: str, begin, end) -> tuple[list, list]:
+        """上游查询交易日，返回 (交易日, 半日市) 的 datetime.date 列表。"""
+        import datetime as _dt
         market_map = {
             "HK": Market.HK,
             "US": Market.US,
@@ -491,13 +1335,79 @@ class QuoteService:
             "CRYPTO": Market.Crypto,
         }
         mkt = market_map.get(market_key, Market.HK)
-        resp = await self._ctx.trading_days(mkt, begin, end)
-        def _fmt(d) -> str:
-            return d.strftime("%Y-%m-%d") if hasattr(d, "strftime") else str(d)
-        return {
-            "market":             market_key,
-            "begin":              _fmt(begin),
-            "end":                _fmt(end),
-            "trading_days":       [_fmt(d) for d in getattr(resp, "trading_days", [])],
-            "half_trading_days":  [_fmt(d) for d in getattr(resp, "half_trading_days", [])],
-        }
+        resp = await self._upstream.call("quote", self._ctx.trading_days, mkt, begin, end)
+
+        def _to_date(d):
+            return d if isinstance(d, _dt.date) else _dt.date.fromisoformat(str(d))
+
+        return (
+            [_to_date(d) for d in getattr(resp, "trading_days", [])],
+            [_to_date(d) for d in getattr(resp, "half_trading_days", [])],
+        )
+
+    async def refresh_market_calendar(self):
+        """从上游重新加载交易时段，以及各市场过去约一年到未来 60 天的交易日（按市场当地日期）。"""
+        self._calendar.set_sessions(await self._fetch_trading_session())
+        for market, tz in MARKET_TIMEZONES.items():
+            today = datetime.datetime.now(tz).date()
+            loaded = await self._fetch_trading_days_chunked(market, today)
+            if loaded is not None:
+                self._calendar.set_trading_days(market, *loaded)
+
+    async def _fetch_trading_days_chunked(
+        self, market: str, today: datetime.date,
+    ) -> tuple[datetime.date, datetime.date, list, list] | None:
+        """
+        分段拉取 market 过去 CALENDAR_PAST_DAYS 天到未来 CALENDAR_AHEAD_DAYS 天的交易日，
+        返回 (覆盖起点, 覆盖终点, 交易日, 半日市)。今天之后的分段失败时（未来日期不可查）覆盖区间截至前一段；
+        截至今天的分段失败时返回 None，保留已有缓存。
+        """
+        step = datetime.timedelta(days=self.CALENDAR_CHUNK_DAYS)
+        begin = today - datetime.timedelta(days=self.CALENDAR_PAST_DAYS)
+        last = today + datetime.timedelta(days=self.CALENDAR_AHEAD_DAYS)
+        chunks = []
+        lo = begin
+        while lo <= last:
+            hi = min(lo + step - datetime.timedelta(days=1), last)
+            chunks.append((lo, hi))
+            lo = hi + datetime.timedelta(days=1)
+
+        results = await asyncio.gather(
+            *(self._fetch_trading_days(market, lo, hi) for lo, hi in chunks), return_exceptions=True,
+        )
+        trading: list = []
+        half: list = []
+        end = None
+        for (lo, hi), result in zip(chunks, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"trading_days({market}, {lo}..{hi}) failed: {result}")
+                if lo <= today:
+                    return None
+                break
+            trading += result[0]
+            half += result[1]
+            end = hi
+        return begin, end, trading, half
+
+    async def _refresh_calendar_periodically(self):
+        set_background()
+        while True:
+            try:
+                await self.refresh_market_calendar()
+                logger.info("Market calendar refreshed.")
+            except Exception as e:
+                logger.warning(f"market calendar refresh failed: {e}")
+            await asyncio.sleep(self._calendar_refresh_interval)
+
+    def get_market_status(self, market: str | None = None) -> list[dict]:
+        """各市场（或指定市场）的开闭市状态，完全基于本地日历计算。"""
+        markets = [market.upper()] if market else list(MARKET_TIMEZONES)
+        return [self._calendar.status(m) for m in markets]
+
+    @property
+    def market_calendar(self) -> MarketCalendar:
+        return self._calendar
+
+    @property
+    def market_calendar_stats(self) -> dict:
+        return self._calendar.stats()
@@ -0,0 +1,150 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from upstream_scheduler import INTERACTIVE, current_priority
+
+# 单个 key 的加载协程
+Loader = Callable[[], Awaitable[Any]]
+# 批量加载：未命中的 key 列表 → {key: value}，结果中缺失的 key 视为不存在（不缓存）
+BatchLoader = Callable[[list], Awaitable[dict]]
+
+
+class RequestCache:
+    """
+    上游请求缓存：按 key 缓存 ttl 秒，超过 max_entries 时淘汰最久未使用的条目（LRU）。
+    同一 key 已有进行中的上游请求时，后来的请求等待该请求的结果（single-flight），不再重复请求；
+    上游请求在独立任务中执行，发起它的请求被取消时仍会完成并写入缓存。
+    进行中的请求按发起者的上游优先级区分：交互请求只合并到交互优先级发起的请求上，
+    不会排在后台限速之后；后台请求可以合并到任一优先级的请求上。
+    ttl 为 0 时只合并并发请求，不缓存结果。
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 10000):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        # key → (过期时间, 值)
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        # (优先级, key) → 进行中的加载任务
+        self._inflight: dict[tuple[int, Hashable], asyncio.Task] = {}
+        # 计数器
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _lookup(self, key: Hashable, now: float):
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] <= now:
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, entry[1]
+
+    def _store(self, key: Hashable, value: Any, now: float):
+        if self._ttl <= 0:
+            return
+        self._data[key] = (now + self._ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self._max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def _pending(self, key: Hashable, priority: int) -> asyncio.Task | None:
+        """priority 的调用方可以合并的进行中任务：交互优先级的任务优先。"""
+        task = self._inflight.get((INTERACTIVE, key))
+        if task is None and priority != INTERACTIVE:
+            task = self._inflight.get((priority, key))
+        return task
+
+    def _start(self, keys: list, load: Callable[[], Awaitable[dict]], priority: int) -> asyncio.Task:
+        """
+        在独立任务中执行加载（沿用调用方的上下文与优先级），结果为 {key: value}；keys 在加载期间登记为进行中。
+        调用方（及合并进来的等待者）通过 asyncio.shield 等待：某个调用方被取消不会取消加载，
+        也不会让其他等待者失败。
+        """
+        async def _run() -> dict:
+            try:
+                loaded = await load()
+                now = time.monotonic()
+                for key in keys:
+                    value = loaded.get(key)
+                    if value is not None:
+                        self._store(key, value, now)
+                return loaded
+            finally:
+                for key in keys:
+                    if self._inflight.get((priority, key)) is task:
+                        del self._inflight[(priority, key)]
+
+        task = asyncio.ensure_future(_run())
+        # 所有等待者都已取消时避免 "exception was never retrieved" 告警
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        for key in keys:
+            self._inflight[(priority, key)] = task
+        return task
+
+    async def get(self, key: Hashable, loader: Loader) -> Any:
+        found, value = self._lookup(key, time.monotonic())
+        if found:
+            self.hits += 1
+            return value
+        priority = current_priority()
+        task = self._pending(key, priority)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+
+            async def _load() -> dict:
+                return {key: await loader()}
+
+            task = self._start([key], _load, priority)
+        return (await asyncio.shield(task)).get(key)
+
+    async def get_many(self, keys: list, loader: BatchLoader) -> dict:
+        """
+        批量读取：命中缓存的直接返回，正在请求中的等待其结果，
+        其余 key 合并为一次 loader 调用。返回 {key: value}，不存在的 key 不出现在结果中。
+        """
+        now = time.monotonic()
+        priority = current_priority()
+        result: dict = {}
+        waiting: dict[Hashable, asyncio.Task] = {}
+        missing: list = []
+        for key in dict.fromkeys(keys):
+            found, value = self._lookup(key, now)
+            if found:
+                self.hits += 1
+                result[key] = value
+            elif (task := self._pending(key, priority)) is not None:
+                self.coalesced += 1
+                waiting[key] = task
+            else:
+                self.misses += 1
+                missing.append(key)
+
+        if missing:
+            task = self._start(missing, lambda: loader(missing), priority)
+            for key in missing:
+                waiting[key] = task
+
+        for key, task in waiting.items():
+            value = (await asyncio.shield(task)).get(key)
+            if value is not None:
+                result[key] = value
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "ttl":       self._ttl,
+            "entries":   len(self._data),
+            "inflight":  len(self._inflight),
+            "hits":      self.hits,
+            "misses":    self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+        }
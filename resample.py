@@ -0,0 +1,118 @@
+"""
+自定义周期 K 线：由 SDK 支持的基础周期 K 线合成任意 N 分钟 / N 小时 / N 日 K 线。
+
+K 线时间戳按 LongPort 的约定为 K 线开始时间；分组只取决于每根 K 线自身的时间，与取数区间的起点无关，
+同一根合成 K 线不随查询的 count / start 变化。
+
+  Nmin / Nh —— 由能整除 N 分钟的最大分钟周期（1 / 5 / 15 / 30 / 60min）合成，按交易时段对齐：
+               每个时段从开始时间起每 N 分钟一根，不跨越午休 / 隔夜，时段末尾不足 N 分钟的部分单独成一根；
+               时段未知（日历未加载）或不在任何时段内的 K 线按当地时间零点起每 N 分钟一根
+  Nday      —— 由日 K 合成：从固定起点（1970-01-05，周一）起按交易日序号每 N 个一组；
+               交易日按周一至周五计数（市场未知时按自然日），节假日所在的组根数较少
+
+合成按列进行：先求出各根的下标区间，再对各列切片用内置 max / min / sum 聚合。
+"""
+import datetime as dt
+import re
+from bisect import bisect_right
+from decimal import Decimal
+
+from candle_store import bar_date
+
+# 分钟周期 → 分钟数，按从大到小尝试作为基础周期
+BASE_MINUTES: dict[str, int] = {"60min": 60, "30min": 30, "15min": 15, "5min": 5, "1min": 1}
+
+_CUSTOM_PERIOD = re.compile(r"^([1-9]\d*)(min|h|day)$")
+# Nday 分组的固定起点（周一）
+_DAY_EPOCH = dt.date(1970, 1, 5).toordinal()
+
+
+def parse_period(period: str) -> tuple[str, int] | None:
+    """自定义周期 → (基础周期, 每根包含的基础 K 线数)，如 2h → ("60min", 2)、10min → ("5min", 2)；无法识别时返回 None。"""
+    match = _CUSTOM_PERIOD.match(period)
+    if match is None:
+        return None
+    n, unit = int(match.group(1)), match.group(2)
+    if unit == "day":
+        return "day", n
+    minutes = n * 60 if unit == "h" else n
+    for base, base_minutes in BASE_MINUTES.items():
+        if minutes % base_minutes == 0:
+            return base, minutes // base_minutes
+    return None
+
+
+def _intraday_labels(ts: list[int], width: int, sessions: list[tuple[int, int]], tz: dt.tzinfo) -> list[int]:
+    """每根分钟 K 所属合成 K 线的时间戳（该组的开始时间）。"""
+    starts = [begin for begin, _ in sessions]
+    labels = []
+    for t in ts:
+        i = bisect_right(starts, t) - 1
+        if i >= 0 and t < sessions[i][1]:
+            origin = starts[i]
+        else:
+            local = dt.datetime.fromtimestamp(t, tz)
+            origin = t - (local.hour * 3600 + local.minute * 60 + local.second)
+        labels.append(origin + (t - origin) // width * width)
+    return labels
+
+
+def _day_keys(ts: list[int], multiple: int, tz: dt.tzinfo, weekdays_only: bool) -> list[int]:
+    """每根日 K 所属合成 K 线的组号（自 _DAY_EPOCH 起的交易日序号 // multiple）。"""
+    keys = []
+    for t in ts:
+        days = bar_date(t, "day", tz).toordinal() - _DAY_EPOCH
+        if weekdays_only:
+            weeks, weekday = divmod(days, 7)
+            days = weeks * 5 + min(weekday, 4)
+        keys.append(days // multiple)
+    return keys
+
+
+def _groups(keys: list) -> list[tuple[int, int]]:
+    """把相邻且 key 相同的下标合为一组：[(起始下标, 结束下标)]。"""
+    groups = []
+    lo = 0
+    for hi in range(1, len(keys) + 1):
+        if hi == len(keys) or keys[hi] != keys[lo]:
+            groups.append((lo, hi))
+            lo = hi
+    return groups
+
+
+def resample(
+    rows: list[dict], base: str, multiple: int, sessions: list[tuple[int, int]] | None = None,
+    tz: dt.tzinfo = dt.timezone.utc, weekdays_only: bool = True,
+) -> list[dict]:
+    """
+    把按时间升序的基础周期 K 线（get_candlesticks 的字典格式）合成为每根 multiple 个基础周期的 K 线。
+    sessions 为分钟 K 所跨交易日的各交易时段 [(开始, 结束)]（Unix 秒，升序）；tz 为市场时区；
+    weekdays_only 为 False 时 Nday 按自然日计数（如加密货币）。
+    """
+    if not rows:
+        return []
+    ts = [r["timestamp"] for r in rows]
+    if base == "day":
+        groups = [(lo, hi, ts[lo]) for lo, hi in _groups(_day_keys(ts, multiple, tz, weekdays_only))]
+    else:
+        labels = _intraday_labels(ts, BASE_MINUTES[base] * multiple * 60, sessions or [], tz)
+        groups = [(lo, hi, labels[lo]) for lo, hi in _groups(labels)]
+
+    opens = [Decimal(r["open"]) for r in rows]
+    closes = [Decimal(r["close"]) for r in rows]
+    highs = [Decimal(r["high"]) for r in rows]
+    lows = [Decimal(r["low"]) for r in rows]
+    volumes = [r["volume"] for r in rows]
+    turnovers = [Decimal(r["turnover"]) for r in rows]
+    return [
+        {
+            "timestamp": label,
+            "open":      str(opens[lo]),
+            "close":     str(closes[hi - 1]),
+            "high":      str(max(highs[lo:hi])),
+            "low":       str(min(lows[lo:hi])),
+            "volume":    sum(volumes[lo:hi]),
+            "turnover":  str(sum(turnovers[lo:hi])),
+        }
+        for lo, hi, label in groups
+    ]
@@ -0,0 +1,138 @@
+"""
+K 线 / 分时 / 逐笔成交等表格型 REST 响应的输出格式（query 参数 format）。
+
+  json     —— 默认，逐行对象数组，与原有响应一致
+  columns  —— 列式 JSON：{"fields": [...], "count": n, "columns": {字段: [值, ...]}}，值的类型与 json 相同
+  csv      —— 首行为字段名的 CSV 文本
+  binary   —— 列式紧凑数组：一行 JSON 头 + 各列的原始字节（小端），可直接用 numpy.frombuffer /
+              JS TypedArray 读取，无需逐值解析：
+                int      → int64（"<i8"）
+                decimal  → 按列统一小数位数（scale）缩放的 int64，实际值 = 整数 / 10^scale
+                string   → uint32 编号（"<u4"），编号 → 字符串见 labels
+              JSON 头以空格补齐到 8 字节的整数倍，各列按头中顺序排列，每列末尾补零到 8 字节的整数倍，
+              保证每列的起始偏移都按 8 字节对齐
+
+各列的类型由该列的值推断：全为整数为 int，全为十进制数字字符串为 decimal，否则为 string；
+int / decimal 列（缩放后）有值超出 int64 范围时整列按 string 输出。
+"""
+import csv
+import io
+import json
+import re
+import sys
+from array import array
+
+from fastapi import Response
+
+from wire_format import dumps_json
+
+FORMAT_JSON = "json"
+FORMAT_COLUMNS = "columns"
+FORMAT_CSV = "csv"
+FORMAT_BINARY = "binary"
+TABLE_FORMATS = (FORMAT_JSON, FORMAT_COLUMNS, FORMAT_CSV, FORMAT_BINARY)
+
+# 结果为空时输出的字段（非空时以第一行的字段为准）
+CANDLE_FIELDS = ("timestamp", "open", "close", "high", "low", "volume", "turnover")
+INTRADAY_FIELDS = ("timestamp", "price", "avg_price", "volume", "turnover")
+TRADE_FIELDS = ("price", "volume", "timestamp", "direction", "trade_type", "trade_session")
+
+# 可按 decimal 列输出的十进制数字串（小数位最多 9 位）；是否放得进 int64 在缩放后另行检查
+_DECIMAL = re.compile(r"^-?\d+(\.\d{1,9})?$")
+_ALIGN = 8
+_INT64_MIN, _INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+
+def _kind(values: list) -> str:
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        return "int"
+    if all(isinstance(v, str) and _DECIMAL.match(v) for v in values):
+        return "decimal"
+    return "string"
+
+
+def _scaled(value: str, scale: int) -> int:
+    """十进制字符串 → 放大 10^scale 倍的整数（直接拼接数字串，避免逐个构造 Decimal）。"""
+    whole, _, frac = value.partition(".")
+    return int(whole + frac.ljust(scale, "0"))
+
+
+def _fits_int64(values: list[int]) -> bool:
+    return not values or (_INT64_MIN <= min(values) and max(values) <= _INT64_MAX)
+
+
+def _packed(values: list, kind: str) -> tuple[dict, array]:
+    if kind == "int" and _fits_int64(values):
+        return {"type": "int", "dtype": "<i8"}, array("q", values)
+    if kind == "decimal":
+        scale = max((len(v.partition(".")[2]) for v in values), default=0)
+        scaled = [_scaled(v, scale) for v in values]
+        if _fits_int64(scaled):
+            return {"type": "decimal", "dtype": "<i8", "scale": scale}, array("q", scaled)
+    labels: dict[str, int] = {}
+    codes = array("I", (labels.setdefault("" if v is None else str(v), len(labels)) for v in values))
+    return {"type": "string", "dtype": "<u4", "labels": list(labels)}, codes
+
+
+def encode_binary(rows: list[dict], fields: list[str]) -> bytes:
+    columns = []
+    packed = []
+    for name in fields:
+        values = [row.get(name) for row in rows]
+        meta, data = _packed(values, _kind(values))
+        if sys.byteorder != "little":
+            data.byteswap()
+        columns.append({"name": name, **meta})
+        raw = data.tobytes()
+        packed.append(raw + bytes(-len(raw) % _ALIGN))
+    head = json.dumps({"count": len(rows), "columns": columns}, ensure_ascii=False).encode()
+    head += b" " * (-(len(head) + 1) % _ALIGN) + b"\n"
+    return head + b"".join(packed)
+
+
+def decode_binary(data: bytes) -> list[dict]:
+    """把 binary 格式解码回与 json 格式相同的逐行对象（供 Python 客户端 / 调试参考）。"""
+    head, _, body = data.partition(b"\n")
+    header = json.loads(head)
+    count = header["count"]
+    columns = {}
+    offset = 0
+    for meta in header["columns"]:
+        values = array("I" if meta["type"] == "string" else "q")
+        size = count * values.itemsize
+        values.frombytes(body[offset:offset + size])
+        if sys.byteorder != "little":
+            values.byteswap()
+        offset += size + (-size % _ALIGN)
+        if meta["type"] == "decimal":
+            scale = meta["scale"]
+            columns[meta["name"]] = [_unscale(v, scale) for v in values]
+        elif meta["type"] == "string":
+            columns[meta["name"]] = [meta["labels"][v] for v in values]
+        else:
+            columns[meta["name"]] = values.tolist()
+    return [{name: col[i] for name, col in columns.items()} for i in range(count)]
+
+
+def _unscale(value: int, scale: int) -> str:
+    if scale == 0:
+        return str(value)
+    digits = str(abs(value)).rjust(scale + 1, "0")
+    return ("-" if value < 0 else "") + digits[:-scale] + "." + digits[-scale:]
+
+
+def render(rows: list[dict], fmt: str, fields: tuple[str, ...]):
+    """按 fmt 输出 rows；json 直接返回 rows，交给 FastAPI 序列化。"""
+    if fmt == FORMAT_JSON:
+        return rows
+    names = list(rows[0]) if rows else list(fields)
+    if fmt == FORMAT_COLUMNS:
+        body = {"fields": names, "count": len(rows), "columns": {n: [row.get(n) for row in rows] for n in names}}
+        return Response(dumps_json(body), media_type="application/json")
+    if fmt == FORMAT_CSV:
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+        writer.writerow(names)
+        writer.writerows([row.get(n) for n in names] for row in rows)
+        return Response(buf.getvalue(), media_type="text/csv; charset=utf-8")
+    return Response(encode_binary(rows, names), media_type="application/octet-stream")
@@ -12,6 +12,8 @@ import logging
 
 from fastapi import APIRouter, HTTPException, Request
 
+from upstream_scheduler import UpstreamBusyError
+
 router = APIRouter(prefix="/api/assets", tags=["assets"])
 logger = logging.getLogger(__name__)
 
@@ -36,6 +38,8 @@ async def get_account_balance(request: Request, currency: str | None = None):
     """
     try:
         return await _svc(request).get_account_balance(currency=currency)
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_account_balance failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
@@ -54,6 +58,8 @@ async def get_stock_positions(request: Request, symbols: str | None = None):
     symbol_list = [s.strip() for s in symbols.split(",") if s.strip()] if symbols else None
     try:
         return await _svc(request).get_stock_positions(symbol_list)
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_stock_positions failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
@@ -69,6 +75,8 @@ async def get_fund_positions(request: Request, symbols: str | None = None):
     symbol_list = [s.strip() for s in symbols.split(",") if s.strip()] if symbols else None
     try:
         return await _svc(request).get_fund_positions(symbol_list)
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_fund_positions failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
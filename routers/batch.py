@@ -0,0 +1,41 @@
+"""
+组合查询路由：一次请求并发执行多个子查询。
+- POST /api/batch
+"""
+from fastapi import APIRouter, HTTPException, Request
+
+from composite_query import run_queries
+from models import BatchRequest
+
+router = APIRouter(prefix="/api", tags=["batch"])
+
+# 单次请求最多携带的子查询数
+MAX_QUERIES = 50
+
+
+@router.post("/batch")
+async def batch(body: BatchRequest, request: Request):
+    """
+    并发执行多个子查询，相同的子查询只执行一次，结果按 id 返回。
+
+    请求示例:
+    ```json
+    {
+      "queries": [
+        {"id": "q", "method": "quotes", "params": {"symbols": ["700.HK"]}},
+        {"id": "d", "method": "depth", "params": {"symbol": "700.HK"}},
+        {"id": "f", "method": "fundamental", "params": {"symbols": ["700.HK"]}}
+      ]
+    }
+    ```
+    """
+    if not body.queries:
+        raise HTTPException(status_code=400, detail="queries 不能为空")
+    if len(body.queries) > MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"queries 最多 {MAX_QUERIES} 个")
+    ids = [q.id for q in body.queries]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="query id 不能重复")
+    svc = request.app.state.quote_service
+    results = await run_queries(svc, [(q.id, q.method, q.params) for q in body.queries])
+    return {"results": results}
@@ -4,6 +4,7 @@
 端点：
   GET /api/fundamental?symbols=700.HK,AAPL.US   静态信息 + 估值指标合并返回
   GET /api/static?symbols=700.HK,AAPL.US        纯静态信息（名称/股本/EPS/BPS/股息率）
+  POST /api/static/refresh?symbols=700.HK        立即从上游刷新静态信息目录（不传 symbols 刷新全部）
   GET /api/indexes?symbols=700.HK,AAPL.US       估值/涨跌指标（PE/PB/各周期涨跌幅）
   GET /api/capital/{symbol}                      资金分布（大/中/小单 流入流出）
 """
@@ -11,6 +12,9 @@ import logging
 
 from fastapi import APIRouter, HTTPException, Request
 
+from composite_query import fundamental
+from upstream_scheduler import UpstreamBusyError
+
 router = APIRouter(prefix="/api", tags=["fundamental"])
 logger = logging.getLogger(__name__)
 
@@ -22,7 +26,7 @@ def _svc(request: Request):
 @router.get("/fundamental")
 async def get_fundamental(symbols: str, request: Request):
     """
-    合并返回静态信息 + 估值指标，按 symbol 对齐。
+    合并返回静态信息 + 估值指标，按 symbol 对齐（两者并发查询）。
     示例: GET /api/fundamental?symbols=700.HK,AAPL.US
     """
     svc = _svc(request)
@@ -30,16 +34,9 @@ async def get_fundamental(symbols: str, request: Request):
     if not symbol_list:
         raise HTTPException(status_code=400, detail="symbols 参数不能为空")
     try:
-        static  = await svc.get_static_info(symbol_list)
-        indexes = await svc.get_calc_indexes(symbol_list)
-        # 以 symbol 为 key 合并
-        index_map = {item["symbol"]: item for item in indexes}
-        result = []
-        for s in static:
-            sym = s["symbol"]
-            merged = {**s, **index_map.get(sym, {})}
-            result.append(merged)
-        return result
+        return await fundamental(svc, symbol_list)
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_fundamental failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
@@ -57,11 +54,30 @@ async def get_static_info(symbols: str, request: Request):
         raise HTTPException(status_code=400, detail="symbols 参数不能为空")
     try:
         return await svc.get_static_info(symbol_list)
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_static_info failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
 
 
+@router.post("/static/refresh")
+async def refresh_static_info(request: Request, symbols: str | None = None):
+    """
+    立即从上游刷新静态信息目录；不传 symbols 时刷新目录中的全部标的。
+    示例: POST /api/static/refresh?symbols=700.HK,AAPL.US
+    """
+    svc = _svc(request)
+    symbol_list = [s.strip() for s in (symbols or "").split(",") if s.strip()]
+    try:
+        return {"refreshed": await svc.refresh_static_info(symbol_list or None)}
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
+    except Exception as e:
+        logger.exception("refresh_static_info failed: %s", e)
+        raise HTTPException(status_code=500, detail="internal server error")
+
+
 @router.get("/indexes")
 async def get_calc_indexes(symbols: str, request: Request):
     """
@@ -74,6 +90,8 @@ async def get_calc_indexes(symbols: str, request: Request):
         raise HTTPException(status_code=400, detail="symbols 参数不能为空")
     try:
         return await svc.get_calc_indexes(symbol_list)
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_calc_indexes failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
@@ -88,6 +106,8 @@ async def get_capital_distribution(symbol: str, request: Request):
     svc = _svc(request)
     try:
         return await svc.get_capital_distribution(symbol)
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_capital_distribution failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
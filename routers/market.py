@@ -2,12 +2,15 @@
 市场日历相关 REST 路由。
 - GET /api/market/sessions         — 所有市场交易时段
 - GET /api/market/trading_days     — 指定市场交易日/半交易日列表
+- GET /api/market/status           — 各市场当前开闭市状态 / 下次开盘 / 下次收盘（本地计算）
 """
 import datetime
 import logging
 
 from fastapi import APIRouter, HTTPException, Query, Request
 
+from upstream_scheduler import UpstreamBusyError
+
 router = APIRouter(prefix="/api/market", tags=["market"])
 logger = logging.getLogger(__name__)
 
@@ -27,8 +30,8 @@ async def get_trading_sessions(request: Request):
       {
         "market": "HK",
         "trade_sessions": [
-          {"begin_time": "09:30", "end_time": "12:00", "trade_session": "NormalTrade"},
-          {"begin_time": "13:00", "end_time": "16:00", "trade_session": "NormalTrade"}
+          {"begin_time": "09:30", "end_time": "12:00", "trade_session": "Intraday"},
+          {"begin_time": "13:00", "end_time": "16:00", "trade_session": "Intraday"}
         ]
       },
       ...
@@ -38,6 +41,8 @@ async def get_trading_sessions(request: Request):
     svc = _quote_service(request)
     try:
         return await svc.get_trading_session()
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_trading_sessions failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
@@ -95,6 +100,43 @@ async def get_trading_days(
 
     try:
         return await svc.get_trading_days(market, begin_date, end_date)
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_trading_days failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
+
+
+@router.get("/status")
+async def get_market_status(
+    request: Request,
+    market: str = Query(None, description="市场代码: HK / US / CN / SG / Crypto，不传返回全部市场"),
+):
+    """
+    各市场当前开闭市状态，基于本地缓存的交易时段与交易日计算，不访问上游。
+
+    响应示例:
+    ```json
+    [
+      {
+        "market": "HK",
+        "local_time": "2025-02-21T10:15:02+08:00",
+        "open": true,
+        "session": "Intraday",
+        "is_trading_day": true,
+        "is_half_day": false,
+        "calendar_known": true,
+        "next_open": "2025-02-21T13:00:00+08:00",
+        "next_close": "2025-02-21T12:00:00+08:00"
+      }
+    ]
+    ```
+    """
+    svc = _quote_service(request)
+    valid_markets = {"HK", "US", "CN", "SG", "CRYPTO"}
+    if market is not None and market.upper() not in valid_markets:
+        raise HTTPException(
+            status_code=400,
+            detail=f"market 参数无效，可选值: HK / US / CN / SG / Crypto",
+        )
+    return svc.get_market_status(market)
@@ -4,9 +4,12 @@
 """
 import logging
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 
-from models import SubscribeRequest
+from models import QuotesRequest, SubscribeRequest
+from resample import parse_period
+from response_format import CANDLE_FIELDS, INTRADAY_FIELDS, TABLE_FORMATS, TRADE_FIELDS, render
+from upstream_scheduler import UpstreamBusyError
 
 router = APIRouter(prefix="/api", tags=["quotes"])
 logger = logging.getLogger(__name__)
@@ -16,21 +19,51 @@ def get_quote_service(request: Request):
     return request.app.state.quote_service
 
 
-@router.get("/quotes")
-async def get_quotes(symbols: str, request: Request):
-    """
-    批量获取行情快照。
-    示例: GET /api/quotes?symbols=700.HK,AAPL.US
-    """
-    svc = get_quote_service(request)
-    symbol_list = [s.strip() for s in symbols.split(",") if s.strip()]
+def _check_format(fmt: str):
+    if fmt not in TABLE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format 无效，可选: {', '.join(TABLE_FORMATS)}")
+
+
+def _set_missing_header(response: Response, symbols: list[str], quotes: list[dict]):
+    """上游部分分片失败或标的不存在时，在 X-Missing-Symbols 头中列出未返回的标的。"""
+    returned = {q["symbol"] for q in quotes}
+    missing = [s for s in dict.fromkeys(symbols) if s not in returned]
+    if missing:
+        response.headers["X-Missing-Symbols"] = ",".join(missing)
+
+
+async def _quotes(svc, symbol_list: list[str], response: Response) -> list[dict]:
     if not symbol_list:
         raise HTTPException(status_code=400, detail="symbols 参数不能为空")
     try:
-        return await svc.get_quotes(symbol_list)
+        result = await svc.get_quotes(symbol_list)
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_quotes failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
+    _set_missing_header(response, symbol_list, result)
+    return result
+
+
+@router.get("/quotes")
+async def get_quotes(symbols: str, request: Request, response: Response):
+    """
+    批量获取行情快照。
+    示例: GET /api/quotes?symbols=700.HK,AAPL.US
+    """
+    symbol_list = [s.strip() for s in symbols.split(",") if s.strip()]
+    return await _quotes(get_quote_service(request), symbol_list, response)
+
+
+@router.post("/quotes")
+async def post_quotes(body: QuotesRequest, request: Request, response: Response):
+    """
+    批量获取行情快照（标的列表放在请求体中，适合上千只标的，不受 URL 长度限制）。
+    示例: POST /api/quotes  {"symbols": ["700.HK", "AAPL.US"]}
+    """
+    symbol_list = [s.strip() for s in body.symbols if s.strip()]
+    return await _quotes(get_quote_service(request), symbol_list, response)
 
 
 @router.get("/quote/{symbol:path}")
@@ -44,6 +77,8 @@ async def get_quote(symbol: str, request: Request):
         return result[0]
     except HTTPException:
         raise
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_quote failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
@@ -55,15 +90,21 @@ async def get_candlesticks(
     request: Request,
     period: str = "day",
     count: int = 90,
+    fmt: str = Query("json", alias="format"),
 ):
     """
     获取历史 K 线（最近 count 根）。
-    period: 1min / 5min / 15min / 30min / 60min / day / week / month / year
+    period: 1min / 5min / 15min / 30min / 60min / day / week / month / year，
+            或自定义周期 Nmin / Nh / Nday（如 10min / 2h / 3day，由基础周期合成）
     count:  返回条数，默认 90
+    format: json（默认）/ columns（列式 JSON）/ csv / binary（列式紧凑数组）
     """
+    _check_format(fmt)
     svc = get_quote_service(request)
     try:
-        return await svc.get_candlesticks(symbol, period, count)
+        return render(await svc.get_candlesticks(symbol, period, count), fmt, CANDLE_FIELDS)
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_candlesticks failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
@@ -77,20 +118,26 @@ async def get_candlesticks_range(
     start: str = None,
     end: str = None,
     adjust: str = "none",
+    fmt: str = Query("json", alias="format"),
 ):
     """
     获取指定日期范围内的全部 K 线。
-    period: 1min / 5min / 15min / 30min / 60min / day / week / month / year
+    period: 1min / 5min / 15min / 30min / 60min / day / week / month / year，或自定义周期 Nmin / Nh / Nday
     start:  YYYY-MM-DD 或 YYYY-MM-DDTHH:MM:SS（注：只取日期部分传给 SDK）
     end:    同上
-    adjust: none（不复权）/ forward（前复权）
+    adjust: none（不复权）/ forward（前复权）/ backward（后复权）
+    format: json（默认）/ columns（列式 JSON）/ csv / binary（列式紧凑数组）
     """
     import datetime
+    _check_format(fmt)
     svc = get_quote_service(request)
 
     VALID_PERIODS = {"1min", "5min", "15min", "30min", "60min", "day", "week", "month", "year"}
-    if period not in VALID_PERIODS:
-        raise HTTPException(status_code=400, detail=f"period 无效，可选: {', '.join(sorted(VALID_PERIODS))}")
+    if period not in VALID_PERIODS and parse_period(period) is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"period 无效，可选: {', '.join(sorted(VALID_PERIODS))}，或自定义周期如 10min / 2h / 3day",
+        )
 
     def _parse_dt(s: str):
         if not s:
@@ -108,7 +155,10 @@ async def get_candlesticks_range(
         raise HTTPException(status_code=400, detail="start 不能晚于 end")
 
     try:
-        return await svc.get_candlesticks_by_date(symbol, period, start_dt, end_dt, adjust)
+        rows = await svc.get_candlesticks_by_date(symbol, period, start_dt, end_dt, adjust)
+        return render(rows, fmt, CANDLE_FIELDS)
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_candlesticks_range failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
@@ -119,29 +169,47 @@ async def get_trades(
     symbol: str,
     request: Request,
     count: int = 100,
+    start: int | None = None,
+    end: int | None = None,
+    direction: str | None = None,
+    before: int | None = None,
+    fmt: str = Query("json", alias="format"),
 ):
     """
-    逐笔成交记录（最近 count 笔，最大 1000）。
+    逐笔成交记录（最近 count 笔）。
+    已订阅标的由本地成交缓冲返回，count 上限为缓冲容量，可按时间范围 / 方向过滤、按 seq 向前翻页；
+    其余情况回源上游，最多 1000 笔。format 同 /candlesticks。
     示例: GET /api/trades/NVDA.US?count=200
+          GET /api/trades/700.HK?start=1771621140&end=1771621200&direction=Up
     """
     svc = get_quote_service(request)
-    count = min(max(count, 1), 1000)
+    VALID_DIRECTIONS = {"Up", "Down", "Neutral"}
+    if direction is not None and direction not in VALID_DIRECTIONS:
+        raise HTTPException(status_code=400, detail=f"direction 无效，可选: {', '.join(sorted(VALID_DIRECTIONS))}")
+    _check_format(fmt)
+    count = min(max(count, 1), max(svc.tick_capacity, 1000))
     try:
-        return await svc.get_trades(symbol, count)
+        return render(await svc.get_trades(symbol, count, start, end, direction, before), fmt, TRADE_FIELDS)
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_trades failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
 
 
 @router.get("/intraday/{symbol:path}")
-async def get_intraday(symbol: str, request: Request):
+async def get_intraday(symbol: str, request: Request, fmt: str = Query("json", alias="format")):
     """
-    当日分时数据（每分钟价格、均价、成交量、成交额）。
+    当日分时数据（每分钟价格、均价、成交量、成交额）。format 同 /candlesticks。
     示例: GET /api/intraday/NVDA.US
+          GET /api/intraday/NVDA.US?format=csv
     """
+    _check_format(fmt)
     svc = get_quote_service(request)
     try:
-        return await svc.get_intraday(symbol)
+        return render(await svc.get_intraday(symbol), fmt, INTRADAY_FIELDS)
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_intraday failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
@@ -149,15 +217,66 @@ async def get_intraday(symbol: str, request: Request):
 
 @router.get("/depth/{symbol:path}")
 async def get_depth(symbol: str, request: Request):
-    """获取盘口十档数据。"""
+    """获取盘口十档数据（已订阅标的直接返回推送维护的本地盘口）。"""
     svc = get_quote_service(request)
     try:
         return await svc.get_depth(symbol)
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("get_depth failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
 
 
+@router.get("/depth_metrics/{symbol:path}")
+async def get_depth_metrics(symbol: str, request: Request, levels: int = 5):
+    """
+    盘口衍生指标：价差、中间价、微价格、前 levels 档买卖量失衡。
+    已订阅标的由本地盘口直接计算，不访问上游。
+    示例: GET /api/depth_metrics/700.HK?levels=5
+    """
+    svc = get_quote_service(request)
+    levels = min(max(levels, 1), 10)
+    try:
+        return await svc.get_book_metrics(symbol, levels)
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
+    except Exception as e:
+        logger.exception("get_depth_metrics failed: %s", e)
+        raise HTTPException(status_code=500, detail="internal server error")
+
+
+@router.get("/bars/{symbol:path}")
+async def get_bars(symbol: str, request: Request, period: str = "1min", count: int = 100):
+    """
+    由实时逐笔成交聚合的日内 K 线：最近 count 根已收盘 K 线 + 进行中的 K 线。
+    仅对已订阅标的可用，不访问上游。
+    示例: GET /api/bars/700.HK?period=1min&count=100
+    """
+    svc = get_quote_service(request)
+    if period not in svc.bar_periods:
+        raise HTTPException(status_code=400, detail=f"period 无效，可选: {', '.join(svc.bar_periods)}")
+    count = min(max(count, 1), 1000)
+    result = svc.get_bars(symbol, period, count)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"{symbol} 未订阅")
+    return result
+
+
+@router.get("/indicators/{symbol:path}")
+async def get_indicators(symbol: str, request: Request):
+    """
+    流式指标快照：VWAP、滚动窗口成交量、成交价 EMA，由实时逐笔成交增量维护。
+    仅对已订阅且已有成交的标的可用，不访问上游。
+    示例: GET /api/indicators/700.HK
+    """
+    svc = get_quote_service(request)
+    result = svc.get_indicators(symbol)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"{symbol} 未订阅或尚无成交")
+    return result
+
+
 @router.post("/subscribe")
 async def subscribe(body: SubscribeRequest, request: Request):
     """订阅实时推送。"""
@@ -165,6 +284,8 @@ async def subscribe(body: SubscribeRequest, request: Request):
     try:
         await svc.subscribe(body.symbols)
         return {"subscribed": svc.subscribed_symbols}
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("subscribe failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
@@ -177,6 +298,8 @@ async def unsubscribe(symbol: str, request: Request):
     try:
         await svc.unsubscribe([symbol])
         return {"subscribed": svc.subscribed_symbols}
+    except UpstreamBusyError:
+        raise HTTPException(status_code=503, detail="upstream busy, retry later")
     except Exception as e:
         logger.exception("unsubscribe failed: %s", e)
         raise HTTPException(status_code=500, detail="internal server error")
@@ -0,0 +1,110 @@
+"""
+标的静态信息目录（名称、交易所、币种、每手股数、股本、EPS / BPS 等）。
+
+静态信息日内几乎不变：目录常驻内存，并以 JSON 快照文件持久化（与自选股一样无需数据库），
+重启后立即可用；超过 max_age 的条目视为过期，由每日刷新任务或下一次请求重新拉取。
+path 为空时只保存在内存中。
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class StaticCatalog:
+    """symbol → (静态信息字典, 拉取时间) 的内存目录 + JSON 快照持久化。"""
+
+    def __init__(self, path: str = "", max_age: float = 86400.0):
+        self._path = Path(path).expanduser() if path else None
+        self._max_age = max_age
+        self._entries: dict[str, tuple[dict, float]] = {}
+        self._save_lock = asyncio.Lock()
+
+    def load(self):
+        """读入快照文件（启动时调用）；文件不存在或损坏时从空目录开始，格式不对的条目跳过。"""
+        if self._path is None or not self._path.exists():
+            return
+        try:
+            raw = json.loads(self._path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.warning(f"static catalog {self._path} unreadable, starting empty: {e}")
+            return
+        if not isinstance(raw, dict):
+            logger.warning(f"static catalog {self._path} is not a JSON object, starting empty")
+            return
+        skipped = 0
+        for sym, entry in raw.items():
+            try:
+                data, fetched_at = entry["data"], float(entry["fetched_at"])
+            except (TypeError, KeyError, ValueError):
+                skipped += 1
+                continue
+            if not isinstance(data, dict):
+                skipped += 1
+                continue
+            self._entries[sym] = (data, fetched_at)
+        if skipped:
+            logger.warning(f"static catalog {self._path}: skipped {skipped} malformed entries")
+        logger.info(f"Static catalog loaded: {len(self._entries)} symbols from {self._path}")
+
+    def lookup(self, symbols: list[str]) -> tuple[dict[str, dict], list[str]]:
+        """返回 (未过期的条目, 缺失或过期的标的)。"""
+        now = time.time()
+        found: dict[str, dict] = {}
+        missing: list[str] = []
+        for sym in symbols:
+            entry = self._entries.get(sym)
+            if entry is not None and now - entry[1] < self._max_age:
+                found[sym] = entry[0]
+            else:
+                missing.append(sym)
+        return found, missing
+
+    def peek(self, symbol: str) -> dict | None:
+        """不论是否过期，返回已有条目（上游不可用时兜底）。"""
+        entry = self._entries.get(symbol)
+        return entry[0] if entry is not None else None
+
+    def stale_symbols(self) -> list[str]:
+        now = time.time()
+        return [sym for sym, (_, fetched_at) in self._entries.items() if now - fetched_at >= self._max_age]
+
+    @property
+    def symbols(self) -> list[str]:
+        return list(self._entries)
+
+    async def store(self, rows: dict[str, dict]):
+        """写入（覆盖）一批条目并保存快照；文件写入在线程池中执行，不阻塞事件循环。"""
+        if not rows:
+            return
+        now = time.time()
+        for sym, data in rows.items():
+            self._entries[sym] = (data, now)
+        if self._path is None:
+            return
+        async with self._save_lock:
+            snapshot = json.dumps(
+                {sym: {"data": data, "fetched_at": ts} for sym, (data, ts) in self._entries.items()},
+                ensure_ascii=False,
+            )
+            try:
+                await asyncio.to_thread(self._write, snapshot)
+            except OSError as e:
+                logger.warning(f"static catalog save to {self._path} failed: {e}")
+
+    def _write(self, snapshot: str):
+        # 先写临时文件再替换，进程中途退出也不会留下半个文件
+        tmp = self._path.with_name(self._path.name + ".tmp")
+        tmp.write_text(snapshot, encoding="utf-8")
+        os.replace(tmp, self._path)
+
+    def stats(self) -> dict:
+        return {
+            "path":    str(self._path) if self._path else None,
+            "symbols": len(self._entries),
+            "stale":   len(self.stale_symbols()),
+        }
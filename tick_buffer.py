@@ -0,0 +1,133 @@
+"""
+已订阅标的的逐笔成交环形缓冲。
+
+每个标的一份定容缓冲，按列存入 array（时间戳 / 缩放价格 / 量 / 方向码 / 成交类型与时段的字符串 id），
+写满后覆盖最旧的成交。数组随写入增长到容量为止，内存与实际成交笔数成正比。
+成交按推送顺序写入，时间戳视为单调不减，时间范围查询使用二分查找。
+"""
+from array import array
+from decimal import Decimal
+
+from wire_format import DIRECTION_CODES, STRINGS
+
+_MAX_SCALE = 9
+_DIRECTION_NAMES = {0: "Neutral", 1: "Down", 2: "Up"}
+
+
+def _decimals(value: Decimal) -> int:
+    exponent = value.as_tuple().exponent
+    return -exponent if isinstance(exponent, int) and exponent < 0 else 0
+
+
+class TickBuffer:
+    """单个标的的成交环形缓冲；逻辑下标 0 为缓冲中最旧的一笔。"""
+
+    __slots__ = ("capacity", "scale", "ts", "px", "vol", "dir", "trade_type", "session", "head", "total")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.scale = 0
+        self.ts = array("I")
+        self.px = array("q")
+        self.vol = array("q")
+        self.dir = array("B")
+        self.trade_type = array("I")
+        self.session = array("I")
+        # 写满后最旧一笔所在的物理位置
+        self.head = 0
+        # 累计写入笔数；第 n 笔（从 0 起）的 seq 即 n
+        self.total = 0
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def append(self, ts: int, price: Decimal, volume: int, direction: str, trade_type: str, session: str):
+        scale = min(_decimals(price), _MAX_SCALE)
+        if scale > self.scale:
+            factor = 10 ** (scale - self.scale)
+            self.px = array("q", (p * factor for p in self.px))
+            self.scale = scale
+        row = (
+            ts,
+            int(price.scaleb(self.scale)),
+            volume,
+            DIRECTION_CODES.get(direction, 0),
+            STRINGS.intern(trade_type),
+            STRINGS.intern(session),
+        )
+        columns = (self.ts, self.px, self.vol, self.dir, self.trade_type, self.session)
+        if len(self.ts) < self.capacity:
+            for col, value in zip(columns, row):
+                col.append(value)
+        else:
+            for col, value in zip(columns, row):
+                col[self.head] = value
+            self.head = (self.head + 1) % self.capacity
+        self.total += 1
+
+    def _phys(self, i: int) -> int:
+        return (self.head + i) % self.capacity if self.head else i
+
+    def _lower(self, ts: int) -> int:
+        """第一笔时间戳 >= ts 的逻辑下标。"""
+        lo, hi = 0, len(self.ts)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts[self._phys(mid)] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    @property
+    def oldest_timestamp(self) -> int | None:
+        return self.ts[self._phys(0)] if self.ts else None
+
+    def query(
+        self,
+        count: int,
+        start: int | None = None,
+        end: int | None = None,
+        direction: str | None = None,
+        before: int | None = None,
+    ) -> list[dict]:
+        """
+        返回 [start, end] 时间范围内、seq < before、方向匹配的最近 count 笔成交，按时间从早到晚排列。
+        """
+        n = len(self.ts)
+        first_seq = self.total - n
+        lo = self._lower(start) if start is not None else 0
+        hi = self._lower(end + 1) if end is not None else n
+        if before is not None:
+            hi = min(hi, max(before - first_seq, 0))
+        code = DIRECTION_CODES.get(direction) if direction else None
+        picked = []
+        i = hi - 1
+        while i >= lo and len(picked) < count:
+            p = self._phys(i)
+            if code is None or self.dir[p] == code:
+                picked.append((i, p))
+            i -= 1
+        picked.reverse()
+        return [self._row(first_seq + i, p) for i, p in picked]
+
+    def _row(self, seq: int, p: int) -> dict:
+        return {
+            "seq":           seq,
+            "price":         str(Decimal(self.px[p]).scaleb(-self.scale)),
+            "volume":        self.vol[p],
+            "timestamp":     self.ts[p],
+            "direction":     _DIRECTION_NAMES.get(self.dir[p], ""),
+            "trade_type":    STRINGS.lookup(self.trade_type[p]),
+            "trade_session": STRINGS.lookup(self.session[p]),
+        }
+
+    def stats(self) -> dict:
+        columns = (self.ts, self.px, self.vol, self.dir, self.trade_type, self.session)
+        return {
+            "size":     len(self.ts),
+            "capacity": self.capacity,
+            "total":    self.total,
+            "bytes":    sum(col.buffer_info()[1] * col.itemsize for col in columns),
+            "oldest":   self.oldest_timestamp,
+        }
@@ -3,6 +3,8 @@ from decimal import Decimal
 
 from longport.openapi import Config, AsyncTradeContext
 
+from upstream_scheduler import UpstreamScheduler
+
 logger = logging.getLogger(__name__)
 
 
@@ -16,8 +18,9 @@ def _d(v) -> str:
 class TradeService:
     """封装 LongPort AsyncTradeContext，提供资产查询能力。"""
 
-    def __init__(self):
+    def __init__(self, scheduler: UpstreamScheduler | None = None):
         self._ctx: AsyncTradeContext | None = None
+        self._upstream = scheduler or UpstreamScheduler()
 
     async def start(self):
         config = Config.from_env()
@@ -33,7 +36,7 @@ class TradeService:
         返回各子账户余额。
         currency: 指定货币筛选（如 'USD'/'HKD'），None 表示全部。
         """
-        items = await self._ctx.account_balance(currency=currency)
+        items = await self._upstream.call("trade", self._ctx.account_balance, currency=currency)
         result = []
         for item in items:
             cash_infos = []
@@ -69,7 +72,7 @@ class TradeService:
         返回所有子账户的股票持仓。
         symbols: 按标的过滤，None 表示全部。
         """
-        resp = await self._ctx.stock_positions(symbols=symbols or None)
+        resp = await self._upstream.call("trade", self._ctx.stock_positions, symbols=symbols or None)
         result = []
         for ch in (getattr(resp, "channels", []) or []):
             account_channel = str(getattr(ch, "account_channel", ""))
@@ -94,7 +97,7 @@ class TradeService:
 
     async def get_fund_positions(self, symbols: list[str] | None = None) -> list[dict]:
         """返回基金持仓（若未持有基金则返回空数组）。"""
-        resp = await self._ctx.fund_positions(symbols=symbols or None)
+        resp = await self._upstream.call("trade", self._ctx.fund_positions, symbols=symbols or None)
         result = []
         for ch in (getattr(resp, "channels", []) or []):
             account_channel = str(getattr(ch, "account_channel", ""))
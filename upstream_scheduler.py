@@ -0,0 +1,192 @@
+"""
+LongPort 上游调用的统一调度：每一次 self._ctx.* 调用都先在这里取得令牌。
+
+  - 按接口族（quote / history / subscribe / trade）分别用令牌桶限速（rate 次/秒，burst 为桶容量）
+  - 两个优先级：interactive（REST / WebSocket 请求，默认）与 background（定时刷新、批量任务）；
+    排队时 interactive 总是先于 background 取得令牌，background 也不能把令牌桶取空，
+    始终为 interactive 保留 BACKGROUND_RESERVE 比例的令牌，批量任务运行时交互请求延迟不受影响
+  - 排队超过期限（queue_timeout）的调用抛出 UpstreamBusyError，不再等待
+  - 统计每个接口族各优先级的调用数、排队等待时间与超时数
+
+优先级通过 contextvars 传递：在后台任务中调用 set_background()，或用 background() 包住一段代码，
+其中发起的上游调用都按 background 调度。
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# 接口族 → (每秒令牌数, 桶容量)。LongPort 行情接口合计约 10 次/秒（quote 与 history 分摊），
+# 交易接口约 30 次/30 秒；订阅 / 退订按标的逐只调用日 K 订阅，限额放宽
+DEFAULT_LIMITS: dict[str, tuple[float, float]] = {
+    "quote":     (8.0, 10.0),
+    "history":   (2.0, 4.0),
+    "subscribe": (20.0, 50.0),
+    "trade":     (1.0, 10.0),
+}
+
+_priority: ContextVar[int] = ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+def current_priority() -> int:
+    """当前上下文发起上游调用时使用的优先级。"""
+    return _priority.get()
+
+
+def set_background():
+    """把当前上下文（通常是整个后台任务）发起的上游调用标记为 background。"""
+    _priority.set(BACKGROUND)
+
+
+@contextmanager
+def background():
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class UpstreamBusyError(Exception):
+    """上游调用在限速队列中等待超过期限。"""
+
+
+class _Family:
+    """单个接口族：令牌桶 + 按 (优先级, 到达顺序) 排序的等待队列 + 统计。"""
+
+    def __init__(self, name: str, rate: float, burst: float):
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.waiters: list[tuple[int, int, asyncio.Future]] = []
+        self.wakeup = asyncio.Event()
+        self.pump: asyncio.Task | None = None
+        # 优先级 → [调用数, 累计等待秒数, 最大等待秒数]
+        self.waits = {p: [0, 0.0, 0.0] for p in PRIORITY_NAMES}
+        self.timeouts = 0
+
+    def _need(self, priority: int, reserve: float) -> float:
+        return 1.0 + (self.burst * reserve if priority == BACKGROUND else 0.0)
+
+    def try_take(self, priority: int, reserve: float) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= self._need(priority, reserve):
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def delay(self, priority: int, reserve: float) -> float:
+        """距离该优先级可取得令牌还需等待的秒数。"""
+        return max(self._need(priority, reserve) - self.tokens, 0.0) / self.rate
+
+    def record(self, priority: int, waited: float):
+        entry = self.waits[priority]
+        entry[0] += 1
+        entry[1] += waited
+        entry[2] = max(entry[2], waited)
+
+    def stats(self) -> dict:
+        return {
+            "rate":     self.rate,
+            "burst":    self.burst,
+            "tokens":   round(min(self.burst, self.tokens + (time.monotonic() - self.updated) * self.rate), 2),
+            "queued":   sum(1 for *_, f in self.waiters if not f.done()),
+            "timeouts": self.timeouts,
+            **{
+                PRIORITY_NAMES[p]: {
+                    "calls":       calls,
+                    "avg_wait_ms": round(total / calls * 1000, 2) if calls else 0.0,
+                    "max_wait_ms": round(longest * 1000, 2),
+                }
+                for p, (calls, total, longest) in self.waits.items()
+            },
+        }
+
+
+class UpstreamScheduler:
+    """全部 LongPort 上游调用的限速与优先级调度。"""
+
+    # background 调用必须为 interactive 保留的令牌比例（相对桶容量）
+    BACKGROUND_RESERVE = 0.25
+
+    def __init__(
+        self,
+        limits: dict[str, tuple[float, float]] | None = None,
+        queue_timeout: float = 5.0,
+        background_queue_timeout: float = 120.0,
+    ):
+        limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self._families = {name: _Family(name, rate, burst) for name, (rate, burst) in limits.items()}
+        self._timeouts = {INTERACTIVE: queue_timeout, BACKGROUND: background_queue_timeout}
+        self._seq = itertools.count()
+
+    async def acquire(self, family: str, priority: int | None = None, timeout: float | None = None):
+        """取得一个令牌；排队超过 timeout（默认按优先级取 queue_timeout）时抛出 UpstreamBusyError。"""
+        f = self._families[family]
+        priority = _priority.get() if priority is None else priority
+        start = time.monotonic()
+        # 没有人排队且令牌足够时直接放行
+        if not f.waiters and f.try_take(priority, self.BACKGROUND_RESERVE):
+            f.record(priority, 0.0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(f.waiters, (priority, next(self._seq), future))
+        f.wakeup.set()
+        if f.pump is None or f.pump.done():
+            f.pump = asyncio.create_task(self._pump(f))
+        try:
+            await asyncio.wait_for(future, timeout if timeout is not None else self._timeouts[priority])
+        except asyncio.TimeoutError:
+            f.timeouts += 1
+            raise UpstreamBusyError(
+                f"upstream {family} queue timeout after {time.monotonic() - start:.1f}s"
+            ) from None
+        f.record(priority, time.monotonic() - start)
+
+    def estimate_wait(self, family: str, calls: int) -> float:
+        """按当前令牌与排队情况，估算再发起 calls 次 family 调用全部取得令牌所需的秒数。"""
+        f = self._families[family]
+        tokens = min(f.burst, f.tokens + (time.monotonic() - f.updated) * f.rate)
+        queued = sum(1 for *_, fut in f.waiters if not fut.done())
+        return max(queued + calls - tokens, 0.0) / f.rate
+
+    def queue_timeout(self, priority: int | None = None) -> float:
+        """该优先级（默认取当前上下文的优先级）调用在限速队列中的最长等待秒数。"""
+        return self._timeouts[_priority.get() if priority is None else priority]
+
+    async def call(self, family: str, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """取得 family 的令牌后执行 fn(*args, **kwargs)。"""
+        await self.acquire(family)
+        return await fn(*args, **kwargs)
+
+    async def _pump(self, f: _Family):
+        """按优先级把令牌发给排队者；队首令牌不足时睡到补足，新排队者到达时提前醒来重新判断。"""
+        while f.waiters:
+            priority, _, future = f.waiters[0]
+            if future.done():
+                # 已超时取消
+                heapq.heappop(f.waiters)
+                continue
+            if f.try_take(priority, self.BACKGROUND_RESERVE):
+                heapq.heappop(f.waiters)
+                future.set_result(None)
+                continue
+            f.wakeup.clear()
+            try:
+                await asyncio.wait_for(f.wakeup.wait(), f.delay(priority, self.BACKGROUND_RESERVE))
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict[str, dict]:
+        return {name: f.stats() for name, f in self._families.items()}
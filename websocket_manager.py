@@ -1,48 +1,390 @@
 import asyncio
-import json
 import logging
+from collections import deque
+from typing import Awaitable, Callable, Hashable
+
 from fastapi import WebSocket
 
+from conflation import CONFLATABLE_TYPES
+from delta_encoding import DeltaEncoder
+from wire_format import FORMAT_BINARY, FORMAT_JSON, WIRE_FORMATS, Envelope, build_frames
+
 logger = logging.getLogger(__name__)
 
+# 出站队列满时的处理策略
+POLICY_DROP_OLDEST = "drop_oldest"    # 丢弃最旧的一条
+POLICY_CONFLATE    = "conflate"       # 同一 (type, symbol) 只保留最新一条，无可合并项时丢弃最旧
+POLICY_DISCONNECT  = "disconnect"     # 断开慢客户端
+SLOW_CONSUMER_POLICIES = {POLICY_DROP_OLDEST, POLICY_CONFLATE, POLICY_DISCONNECT}
+
+# 需要客户端通过 options.channels 显式开启才会下发的推送类型
+OPT_IN_CHANNELS = frozenset({"book_metrics", "bar", "indicators"})
+
+
+class _Client:
+    """单个连接的发送端：有界出站队列 + 独立写任务，慢连接不会拖累其他连接。"""
+
+    def __init__(self, websocket: WebSocket, max_queue: int, policy: str, fmt: str = FORMAT_JSON):
+        self.ws = websocket
+        self.symbols: set[str] = set()
+        self.max_queue = max_queue
+        self.policy = policy
+        # 行情队列元素为 [key, Envelope]；key 为 None 的逐条消息（trades / bar 等）不参与合并
+        self.queue: deque[list] = deque()
+        # 控制消息（ack / error）单独排队，不受队列上限与慢消费者策略影响，先于行情发送
+        self.control: deque[Envelope] = deque()
+        self.latest: dict[Hashable, list] = {}
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.closing = False
+        # 批量模式：一次写循环积压的多条消息合并为一个 {"type": "batch"} 帧
+        self.batch = False
+        # 线上格式（连接时协商）；binary 格式下该连接已收到的字符串 id
+        self.format = fmt
+        self.known_ids: set[int] = set()
+        # 增量模式（仅 json 格式）：按连接记录已发送状态
+        self.delta: DeltaEncoder | None = None
+        # 已开启的可选推送类型（见 OPT_IN_CHANNELS）
+        self.channels: set[str] = set()
+        # 按订阅限速：symbol → 最小推送间隔（秒）；被延后的最新消息及其定时器
+        self.min_interval: dict[str, float] = {}
+        self.last_pushed: dict[Hashable, float] = {}
+        self.deferred: dict[Hashable, Envelope] = {}
+        self.timers: dict[Hashable, asyncio.TimerHandle] = {}
+        # 计数器
+        self.sent = 0
+        self.frames = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def enqueue(self, key: Hashable | None, envelope: Envelope) -> bool:
+        """放入出站队列。返回 False 表示按 disconnect 策略需要断开该连接。"""
+        if len(self.queue) >= self.max_queue:
+            if self.policy == POLICY_DISCONNECT:
+                self.dropped += 1
+                return False
+            if key is not None and self.policy == POLICY_CONFLATE:
+                entry = self.latest.get(key)
+                if entry is not None:
+                    # 队列中已有同一 (type, symbol) 的旧消息：原位替换为最新值
+                    entry[1] = envelope
+                    self.dropped += 1
+                    return True
+            old = self.queue.popleft()
+            if old[0] is not None and self.latest.get(old[0]) is old:
+                del self.latest[old[0]]
+            self.dropped += 1
+
+        entry = [key, envelope]
+        queue = self.queue
+        queue.append(entry)
+        if key is not None and self.policy == POLICY_CONFLATE:
+            self.latest[key] = entry
+        depth = len(queue)
+        if depth > self.max_depth:
+            self.max_depth = depth
+        self.wakeup.set()
+        return True
+
+    def pop(self) -> Envelope:
+        entry = self.queue.popleft()
+        if self.latest and entry[0] is not None and self.latest.get(entry[0]) is entry:
+            del self.latest[entry[0]]
+        return entry[1]
+
+    def cancel_timers(self):
+        for handle in self.timers.values():
+            handle.cancel()
+        self.timers.clear()
+        self.deferred.clear()
+
+    def stats(self) -> dict:
+        client = getattr(self.ws, "client", None)
+        return {
+            "client":          f"{client.host}:{client.port}" if client else "",
+            "symbols":         len(self.symbols),
+            "policy":          self.policy,
+            "format":          self.format,
+            "batch":           self.batch,
+            "delta":           self.delta is not None,
+            "channels":        sorted(self.channels),
+            "queue_depth":     len(self.queue) + len(self.control),
+            "max_queue_depth": self.max_depth,
+            "sent":            self.sent,
+            "frames":          self.frames,
+            "dropped":         self.dropped,
+        }
+
 
 class WebSocketManager:
-    """管理所有 WebSocket 客户端连接，并向它们广播行情推送消息。"""
+    """管理所有 WebSocket 客户端连接，按标的把行情推送路由给已订阅的客户端。"""
 
-    def __init__(self):
-        self._connections: set[WebSocket] = set()
+    def __init__(
+        self,
+        max_queue: int = 1000,
+        policy: str = POLICY_DROP_OLDEST,
+        delta_keyframe_interval: float = 30.0,
+        on_disconnect: Callable[[WebSocket], Awaitable[None]] | None = None,
+    ):
+        """on_disconnect(websocket)：每次 disconnect 时调用（客户端断开、写失败或被断开），用于释放该连接的订阅引用，需幂等。"""
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"unknown slow consumer policy: {policy}")
+        self._max_queue = max_queue
+        self._policy = policy
+        self._delta_keyframe_interval = delta_keyframe_interval
+        self._on_disconnect = on_disconnect
+        self._clients: dict[WebSocket, _Client] = {}
+        # symbol → 订阅了该标的的连接集合
+        self._subscriptions: dict[str, set[_Client]] = {}
         self._lock = asyncio.Lock()
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, fmt: str = FORMAT_JSON):
+        if fmt not in WIRE_FORMATS:
+            raise ValueError(f"unknown wire format: {fmt}")
         await websocket.accept()
+        client = _Client(websocket, self._max_queue, self._policy, fmt)
         async with self._lock:
-            self._connections.add(websocket)
-        logger.info(f"WebSocket client connected. Total: {len(self._connections)}")
+            self._clients[websocket] = client
+        client.task = asyncio.create_task(self._writer(client))
+        logger.info(f"WebSocket client connected. Total: {len(self._clients)}")
 
     async def disconnect(self, websocket: WebSocket):
         async with self._lock:
-            self._connections.discard(websocket)
-        logger.info(f"WebSocket client disconnected. Total: {len(self._connections)}")
+            client = self._drop(websocket)
+        if client is not None:
+            if client.task is not None and client.task is not asyncio.current_task():
+                client.task.cancel()
+            logger.info(f"WebSocket client disconnected. Total: {len(self._clients)}")
+        # 连接可能已被写任务移除，而处理中的订阅请求随后才登记引用：每次调用都执行清理（幂等）
+        if self._on_disconnect is not None:
+            try:
+                await self._on_disconnect(websocket)
+            except Exception as e:
+                logger.warning(f"WebSocket disconnect cleanup failed: {e}")
 
-    async def broadcast(self, message: dict):
-        """向所有已连接的客户端广播消息（自动清理失效连接）。"""
-        payload = json.dumps(message, ensure_ascii=False)
-        dead: list[WebSocket] = []
+    def _drop(self, websocket: WebSocket) -> _Client | None:
+        """移除连接及其全部订阅索引（调用方需持有锁）。"""
+        client = self._clients.pop(websocket, None)
+        if client is None:
+            return None
+        client.cancel_timers()
+        for sym in client.symbols:
+            subscribers = self._subscriptions.get(sym)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self._subscriptions[sym]
+        return client
 
+    # ------------------------------------------------------------------ #
+    # 订阅索引
+    # ------------------------------------------------------------------ #
+    async def subscribe(self, websocket: WebSocket, symbols: list[str], max_rate: float | None = None):
+        """
+        登记该连接关注的标的。
+        max_rate: 每个标的 quote / depth 每秒最多推送次数，None 表示不限速；
+                  限速期间只保留最新一条，trades / candlestick 不受影响。
+        """
         async with self._lock:
-            connections = set(self._connections)
+            client = self._clients.get(websocket)
+            if client is None:
+                return
+            if client.delta is not None:
+                # 订阅后的第一条推送以关键帧下发
+                client.delta.reset(symbols)
+            for sym in symbols:
+                client.symbols.add(sym)
+                self._subscriptions.setdefault(sym, set()).add(client)
+                if max_rate:
+                    client.min_interval[sym] = 1.0 / max_rate
+                else:
+                    client.min_interval.pop(sym, None)
 
-        for ws in connections:
-            try:
-                await ws.send_text(payload)
-            except Exception:
-                dead.append(ws)
+    async def unsubscribe(self, websocket: WebSocket, symbols: list[str]):
+        """取消该连接对指定标的的关注。"""
+        async with self._lock:
+            client = self._clients.get(websocket)
+            if client is None:
+                return
+            for sym in symbols:
+                client.symbols.discard(sym)
+                client.min_interval.pop(sym, None)
+                subscribers = self._subscriptions.get(sym)
+                if subscribers is not None:
+                    subscribers.discard(client)
+                    if not subscribers:
+                        del self._subscriptions[sym]
+
+    def set_options(
+        self,
+        websocket: WebSocket,
+        batch: bool | None = None,
+        delta: bool | None = None,
+        channels: list[str] | None = None,
+    ) -> dict:
+        """
+        修改连接的推送选项，返回生效后的选项。
+        delta 仅对 json 格式生效；开启时所有标的从关键帧重新开始。
+        channels 为要开启的可选推送类型（整体替换），未知类型被忽略。
+        """
+        client = self._clients.get(websocket)
+        if client is None:
+            return {}
+        if batch is not None:
+            client.batch = batch
+        if delta is not None and client.format != FORMAT_BINARY:
+            client.delta = DeltaEncoder(self._delta_keyframe_interval) if delta else None
+        if channels is not None:
+            client.channels = {c for c in channels if c in OPT_IN_CHANNELS}
+        return {
+            "batch":    client.batch,
+            "delta":    client.delta is not None,
+            "channels": sorted(client.channels),
+        }
+
+    def symbols_of(self, websocket: WebSocket) -> list[str]:
+        """返回该连接当前订阅的标的列表。"""
+        client = self._clients.get(websocket)
+        return sorted(client.symbols) if client else []
+
+    # ------------------------------------------------------------------ #
+    # 发送（只入队，不等待网络 IO）
+    # ------------------------------------------------------------------ #
+    async def publish(self, symbol: str, message: dict):
+        """仅向订阅了 symbol 的客户端推送消息。"""
+        subscribers = self._subscriptions.get(symbol)
+        if not subscribers:
+            return
+        kind = message.get("type")
+        if kind in OPT_IN_CHANNELS:
+            subscribers = [c for c in subscribers if kind in c.channels]
+            if not subscribers:
+                return
+        envelope = Envelope(message)
+        if kind not in CONFLATABLE_TYPES:
+            # trades / bar 等逐条消息不参与合并
+            self._enqueue_all(list(subscribers), None, envelope)
+            return
+        key = (kind, symbol)
+        immediate = []
+        for client in subscribers:
+            interval = client.min_interval.get(symbol) if client.min_interval else None
+            if interval:
+                self._offer_throttled(client, key, envelope, interval)
+            else:
+                immediate.append(client)
+        self._enqueue_all(immediate, key, envelope)
+
+    async def broadcast(self, message: dict):
+        """向所有已连接的客户端广播消息。"""
+        self._enqueue_all(list(self._clients.values()), None, Envelope(message))
+
+    async def send(self, websocket: WebSocket, message: dict):
+        """向单个连接发送控制消息（ack / error）：走独立的控制队列，不会被慢消费者策略丢弃。"""
+        client = self._clients.get(websocket)
+        if client is not None and not client.closing:
+            client.control.append(Envelope(message))
+            client.wakeup.set()
 
-        if dead:
-            async with self._lock:
-                for ws in dead:
-                    self._connections.discard(ws)
+    def _offer_throttled(self, client: _Client, key: Hashable, envelope: Envelope, interval: float):
+        """限速订阅：间隔未到则暂存最新消息，到期后只下发最新的一条。"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        wait = client.last_pushed.get(key, 0.0) + interval - now
+        if wait <= 0 and key not in client.timers:
+            client.last_pushed[key] = now
+            self._enqueue_all((client,), key, envelope)
+            return
+        client.deferred[key] = envelope
+        if key not in client.timers:
+            client.timers[key] = loop.call_later(max(wait, 0.0), self._release_deferred, client, key)
+
+    def _release_deferred(self, client: _Client, key: Hashable):
+        client.timers.pop(key, None)
+        envelope = client.deferred.pop(key, None)
+        if envelope is None or client.ws not in self._clients:
+            return
+        client.last_pushed[key] = asyncio.get_running_loop().time()
+        self._enqueue_all((client,), key, envelope)
+
+    def _enqueue_all(self, clients, key: Hashable | None, envelope: Envelope):
+        for client in clients:
+            if not client.closing and not client.enqueue(key, envelope):
+                client.closing = True
+                asyncio.create_task(self._evict(client))
+
+    async def _send_control(self, client: _Client):
+        """发送积压的控制消息（单条帧，不合批、不做增量）。"""
+        while client.control:
+            envelope = client.control.popleft()
+            client.sent += 1
+            for frame in build_frames([envelope], client.format, False, client.known_ids):
+                if isinstance(frame, bytes):
+                    await client.ws.send_bytes(frame)
+                else:
+                    await client.ws.send_text(frame)
+                client.frames += 1
+
+    async def _writer(self, client: _Client):
+        """每个连接独立的写任务：先发控制消息，再按序清空行情队列。"""
+        try:
+            while True:
+                await client.wakeup.wait()
+                client.wakeup.clear()
+                await self._send_control(client)
+                if client.format == FORMAT_JSON and not client.batch and client.delta is None:
+                    # 常见情况：逐条发送共享的 JSON 文本，不经过 build_frames
+                    send_text = client.ws.send_text
+                    while client.queue and not client.control:
+                        envelope = client.pop()
+                        client.sent += 1
+                        await send_text(envelope.encode())
+                        client.frames += 1
+                while client.queue and not client.control:
+                    count = len(client.queue) if client.batch else 1
+                    envelopes = [client.pop() for _ in range(count)]
+                    client.sent += count
+                    if client.delta is not None:
+                        # 增量消息按连接生成；关键帧仍复用共享编码
+                        now = asyncio.get_running_loop().time()
+                        envelopes = [
+                            out for out in (client.delta.transform(env, now) for env in envelopes)
+                            if out is not None
+                        ]
+                        if not envelopes:
+                            continue
+                    # 各条消息的编码结果在所有连接间共享，这里只做拼接
+                    for frame in build_frames(envelopes, client.format, client.batch, client.known_ids):
+                        if isinstance(frame, bytes):
+                            await client.ws.send_bytes(frame)
+                        else:
+                            await client.ws.send_text(frame)
+                        client.frames += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 发送失败视为连接已失效：与客户端断开走同一清理流程
+            logger.warning(f"WebSocket send failed, closing {client.stats()['client']}: {e}")
+            await self._close(client, 1011)
+
+    async def _evict(self, client: _Client):
+        """按 disconnect 策略断开慢客户端。"""
+        logger.warning(f"Disconnecting slow WebSocket client: {client.stats()['client']}")
+        await self._close(client, 1008)
+
+    async def _close(self, client: _Client, code: int):
+        """移除连接（释放订阅）并关闭底层 socket。"""
+        client.closing = True
+        await self.disconnect(client.ws)
+        try:
+            await client.ws.close(code=code)
+        except Exception:
+            pass
 
     @property
     def client_count(self) -> int:
-        return len(self._connections)
+        return len(self._clients)
+
+    def stats(self) -> list[dict]:
+        """每个连接的队列深度、已发送与已丢弃计数。"""
+        return [client.stats() for client in self._clients.values()]
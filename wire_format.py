@@ -0,0 +1,308 @@
+"""
+WebSocket 推送的线上编码。
+
+每条推送包装为一个 Envelope，按线上格式惰性编码一次并缓存，
+同一条消息发往多个连接时共享编码结果，不再逐连接重复序列化。
+安装了 orjson 时使用 orjson 编码 JSON，否则回退到标准库 json。
+
+线上格式：
+  json    —— 文本帧，与原有推送格式一致
+  binary  —— quote / depth / trades / candlestick 使用定长 struct 布局的二进制帧（小端），
+             价格为按消息内统一小数位数缩放的 int64，标的等字符串以全局 id 代替，
+             id → 字符串 的映射通过 {"type": "dict"} 文本帧按连接只下发一次；
+             其他消息（ack / error 等）仍为 JSON 文本帧。布局见 API.md。
+"""
+import json
+import struct
+from decimal import Decimal, InvalidOperation
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+WIRE_FORMATS = {FORMAT_JSON, FORMAT_BINARY}
+
+
+def dumps_json(obj) -> str:
+    """编码为紧凑 JSON 文本（保留非 ASCII 字符）。"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+# --------------------------------------------------------------------------- #
+# 二进制布局
+# --------------------------------------------------------------------------- #
+KIND_BATCH       = 0
+KIND_QUOTE       = 1
+KIND_DEPTH       = 2
+KIND_TRADES      = 3
+KIND_CANDLESTICK = 4
+
+# kind, symbol_id, scale, last_done, open, high, low, change, change_pct, turnover, volume, timestamp, is_up
+_QUOTE = struct.Struct("<BIBqqqqqqqQIB")
+# kind, symbol_id, scale, n_asks, n_bids；随后 n_asks + n_bids 个档位
+_DEPTH_HEAD = struct.Struct("<BIBBB")
+# price, volume, order_num（单档量超出 uint32 时该消息回退为 JSON）
+_LEVEL = struct.Struct("<qII")
+# kind, symbol_id, scale, n_trades；随后 n_trades 笔成交
+_TRADES_HEAD = struct.Struct("<BIBH")
+# price, volume, timestamp, direction, trade_type_id, trade_session_id
+_TRADE = struct.Struct("<qQIBII")
+# kind, symbol_id, scale, period_id, open, close, high, low, turnover, volume, timestamp
+_CANDLE = struct.Struct("<BIBIqqqqqQI")
+# kind=0, count；随后每条消息为 uint32 长度 + 消息字节
+_BATCH_HEAD = struct.Struct("<BH")
+_LENGTH = struct.Struct("<I")
+
+DIRECTION_CODES = {"": 0, "Neutral": 0, "Down": 1, "Up": 2}
+_MAX_SCALE = 9
+
+
+class StringTable:
+    """全局字符串 → id 映射（标的代码、K 线周期、成交类型等），id 从 1 开始。"""
+
+    def __init__(self):
+        self._ids: dict[str, int] = {}
+        self._strings: list[str] = [""]
+
+    def intern(self, value: str) -> int:
+        sid = self._ids.get(value)
+        if sid is None:
+            sid = self._ids[value] = len(self._strings)
+            self._strings.append(value)
+        return sid
+
+    def lookup(self, sid: int) -> str:
+        return self._strings[sid]
+
+
+STRINGS = StringTable()
+
+
+def _decimals(value: str) -> int:
+    exponent = Decimal(value).as_tuple().exponent
+    return -exponent if isinstance(exponent, int) and exponent < 0 else 0
+
+
+def _scale_for(values) -> int:
+    return min(max((_decimals(v) for v in values), default=0), _MAX_SCALE)
+
+
+def _scaled(value: str, scale: int) -> int:
+    return int(Decimal(value).scaleb(scale))
+
+
+def _encode_quote(sid: int, d: dict, ids: set) -> bytes:
+    prices = (d["last_done"], d["open"], d["high"], d["low"], d["change"], d["change_pct"], d["turnover"])
+    scale = _scale_for(prices)
+    return _QUOTE.pack(
+        KIND_QUOTE, sid, scale,
+        *(_scaled(p, scale) for p in prices),
+        d["volume"], d["timestamp"], 1 if d["is_up"] else 0,
+    )
+
+
+def _encode_depth(sid: int, d: dict, ids: set) -> bytes:
+    levels = d["asks"] + d["bids"]
+    scale = _scale_for(lv["price"] for lv in levels)
+    parts = [_DEPTH_HEAD.pack(KIND_DEPTH, sid, scale, len(d["asks"]), len(d["bids"]))]
+    parts.extend(_LEVEL.pack(_scaled(lv["price"], scale), lv["volume"], lv["order_num"]) for lv in levels)
+    return b"".join(parts)
+
+
+def _encode_trades(sid: int, d: dict, ids: set) -> bytes:
+    trades = d["trades"]
+    scale = _scale_for(t["price"] for t in trades)
+    parts = [_TRADES_HEAD.pack(KIND_TRADES, sid, scale, len(trades))]
+    for t in trades:
+        type_id = STRINGS.intern(t["trade_type"])
+        session_id = STRINGS.intern(t["trade_session"])
+        ids.add(type_id)
+        ids.add(session_id)
+        parts.append(_TRADE.pack(
+            _scaled(t["price"], scale), t["volume"], t["timestamp"],
+            DIRECTION_CODES.get(t["direction"], 0), type_id, session_id,
+        ))
+    return b"".join(parts)
+
+
+def _encode_candlestick(sid: int, d: dict, ids: set) -> bytes:
+    prices = (d["open"], d["close"], d["high"], d["low"], d["turnover"])
+    scale = _scale_for(prices)
+    period_id = STRINGS.intern(d["period"])
+    ids.add(period_id)
+    return _CANDLE.pack(
+        KIND_CANDLESTICK, sid, scale, period_id,
+        *(_scaled(p, scale) for p in prices),
+        d["volume"], d["timestamp"],
+    )
+
+
+_BINARY_ENCODERS = {
+    "quote":       _encode_quote,
+    "depth":       _encode_depth,
+    "trades":      _encode_trades,
+    "candlestick": _encode_candlestick,
+}
+
+
+def encode_binary(message: dict) -> tuple[bytes, set[int]] | None:
+    """
+    把推送消息编码为二进制帧，返回 (字节, 引用到的字符串 id)。
+    不支持二进制的消息类型或无法缩放的数值返回 None，调用方回退为 JSON 文本帧。
+    """
+    encoder = _BINARY_ENCODERS.get(message.get("type"))
+    if encoder is None:
+        return None
+    try:
+        sid = STRINGS.intern(message["symbol"])
+        ids = {sid}
+        return encoder(sid, message["data"], ids), ids
+    except (KeyError, TypeError, ValueError, InvalidOperation, struct.error):
+        return None
+
+
+class Envelope:
+    """一条待下发的消息及其各线上格式的编码缓存。"""
+
+    __slots__ = ("message", "_json", "_binary")
+
+    _UNSET = object()
+
+    def __init__(self, message: dict):
+        self.message = message
+        self._json: str | None = None
+        self._binary = Envelope._UNSET
+
+    def encode(self) -> str:
+        """JSON 文本编码。"""
+        if self._json is None:
+            self._json = dumps_json(self.message)
+        return self._json
+
+    def binary(self) -> tuple[bytes, set[int]] | None:
+        """二进制编码及其引用的字符串 id；不支持时为 None。"""
+        if self._binary is Envelope._UNSET:
+            self._binary = encode_binary(self.message)
+        return self._binary
+
+
+def build_frames(envelopes: list[Envelope], fmt: str, batch: bool, known_ids: set[int]) -> list:
+    """
+    把一轮待发消息组装成 WebSocket 帧（str → 文本帧，bytes → 二进制帧）。
+    known_ids 为该连接已收到的字符串 id，会被原地更新。
+    """
+    if fmt != FORMAT_BINARY:
+        if batch and len(envelopes) > 1:
+            return ['{"type":"batch","messages":[' + ",".join(e.encode() for e in envelopes) + "]}"]
+        return [e.encode() for e in envelopes]
+
+    frames: list = []
+    new_ids: set[int] = set()
+    group: list[bytes] = []
+
+    def _flush_group():
+        if not group:
+            return
+        if len(group) == 1:
+            frames.append(group[0])
+        else:
+            parts = [_BATCH_HEAD.pack(KIND_BATCH, len(group))]
+            for item in group:
+                parts.append(_LENGTH.pack(len(item)))
+                parts.append(item)
+            frames.append(b"".join(parts))
+        group.clear()
+
+    for env in envelopes:
+        encoded = env.binary()
+        if encoded is None:
+            _flush_group()
+            frames.append(env.encode())
+            continue
+        data, ids = encoded
+        new_ids.update(i for i in ids if i not in known_ids)
+        group.append(data)
+        if not batch or len(group) == 0xFFFF:
+            _flush_group()
+    _flush_group()
+
+    if new_ids:
+        known_ids.update(new_ids)
+        # 字典帧必须先于引用这些 id 的二进制帧
+        frames.insert(0, dumps_json({
+            "type": "dict",
+            "entries": {str(i): STRINGS.lookup(i) for i in sorted(new_ids)},
+        }))
+    return frames
+
+
+# --------------------------------------------------------------------------- #
+# 参考解码（供 Python 客户端 / 调试使用）
+# --------------------------------------------------------------------------- #
+def _unscale(value: int, scale: int) -> str:
+    return str(Decimal(value).scaleb(-scale))
+
+
+def decode_binary(data: bytes, strings: dict[int, str]) -> list[dict]:
+    """把二进制帧解码回与 JSON 推送相同结构的消息列表；strings 为客户端累积的 dict 帧内容。"""
+    if data[0] == KIND_BATCH:
+        _, count = _BATCH_HEAD.unpack_from(data, 0)
+        offset = _BATCH_HEAD.size
+        messages = []
+        for _ in range(count):
+            (length,) = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            messages.extend(decode_binary(data[offset:offset + length], strings))
+            offset += length
+        return messages
+
+    kind = data[0]
+    if kind == KIND_QUOTE:
+        (_, sid, scale, last_done, open_, high, low, change, change_pct, turnover,
+         volume, timestamp, is_up) = _QUOTE.unpack(data)
+        body = {
+            "last_done": _unscale(last_done, scale), "open": _unscale(open_, scale),
+            "high": _unscale(high, scale), "low": _unscale(low, scale),
+            "volume": volume, "turnover": _unscale(turnover, scale),
+            "change": _unscale(change, scale), "change_pct": _unscale(change_pct, scale),
+            "timestamp": timestamp, "is_up": bool(is_up),
+        }
+        return [{"type": "quote", "symbol": strings[sid], "data": body}]
+    if kind == KIND_DEPTH:
+        _, sid, scale, n_asks, n_bids = _DEPTH_HEAD.unpack_from(data, 0)
+        levels = []
+        for i in range(n_asks + n_bids):
+            price, volume, order_num = _LEVEL.unpack_from(data, _DEPTH_HEAD.size + i * _LEVEL.size)
+            levels.append({"price": _unscale(price, scale), "volume": volume, "order_num": order_num})
+        body = {"asks": levels[:n_asks], "bids": levels[n_asks:]}
+        return [{"type": "depth", "symbol": strings[sid], "data": body}]
+    if kind == KIND_TRADES:
+        _, sid, scale, count = _TRADES_HEAD.unpack_from(data, 0)
+        directions = {0: "Neutral", 1: "Down", 2: "Up"}
+        trades = []
+        for i in range(count):
+            price, volume, ts, direction, type_id, session_id = _TRADE.unpack_from(
+                data, _TRADES_HEAD.size + i * _TRADE.size
+            )
+            trades.append({
+                "price": _unscale(price, scale), "volume": volume, "timestamp": ts,
+                "direction": directions.get(direction, ""),
+                "trade_type": strings[type_id], "trade_session": strings[session_id],
+            })
+        return [{"type": "trades", "symbol": strings[sid], "data": {"trades": trades}}]
+    if kind == KIND_CANDLESTICK:
+        (_, sid, scale, period_id, open_, close, high, low, turnover,
+         volume, timestamp) = _CANDLE.unpack(data)
+        body = {
+            "period": strings[period_id],
+            "open": _unscale(open_, scale), "close": _unscale(close, scale),
+            "high": _unscale(high, scale), "low": _unscale(low, scale),
+            "volume": volume, "turnover": _unscale(turnover, scale), "timestamp": timestamp,
+        }
+        return [{"type": "candlestick", "symbol": strings[sid], "data": body}]
+    raise ValueError(f"unknown binary message kind: {kind}")